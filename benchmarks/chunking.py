@@ -0,0 +1,156 @@
+"""
+Benchmark: single-pass Markdown chunker vs. the original character chunker.
+
+Usage:
+    python -m benchmarks.chunking [--size-mb 100] [--max-tokens 512] [--tokenizer tiktoken|words]
+
+Generates a deterministic synthetic vault (structured notes with headings and code blocks,
+plus a few multi-megabyte meeting transcripts and web clippings) and reports throughput,
+chunk counts and token statistics for both chunkers. `--tokenizer words` counts one token
+per word and needs no tiktoken download (useful offline / in CI).
+"""
+
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from src.ingestion.chunking import chunk_markdown, chunk_spans, scan_blocks, tiktoken_token_ends
+
+WORDS = (
+    "azure docker container network volume python index vector search embedding note meeting "
+    "project deadline retrieval cluster deploy pipeline token chunk latency quota storage blob "
+    "über café naïve 東京 数据 — the a of to and in is for on with as by that this"
+).split()
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> list[str]:
+    """The original fixed-size character chunker (1000 chars, 100 overlap)."""
+    chunks, start = [], 0
+    while start < len(text):
+        end = start + chunk_size
+        chunks.append(text[start:end])
+        start += chunk_size - overlap
+    return chunks
+
+
+def word_token_ends(text: str) -> np.ndarray:
+    return np.fromiter((m.end() for m in re.finditer(r"\S+", text)), dtype=np.int64)
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def structured_note(rng: random.Random, target_chars: int) -> str:
+    parts: list[str] = [f"# {_sentence(rng, 3)}"]
+    size = 0
+    while size < target_chars:
+        roll = rng.random()
+        if roll < 0.15:
+            part = f"{'#' * rng.randint(2, 4)} {_sentence(rng, 4)}"
+        elif roll < 0.25:
+            lines = rng.randint(3, 30)
+            code = "\n".join(f"run --{rng.choice(WORDS)} {rng.randint(0, 999)}" for _ in range(lines))
+            part = f"```bash\n{code}\n```"
+        elif roll < 0.35:
+            part = "\n".join(f"- {_sentence(rng, rng.randint(3, 12))}" for _ in range(rng.randint(2, 8)))
+        else:
+            part = " ".join(_sentence(rng, rng.randint(6, 25)) for _ in range(rng.randint(1, 8)))
+        parts.append(part)
+        size += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def transcript_note(rng: random.Random, target_chars: int) -> str:
+    """Meeting transcript / web clipping: few headings, long lines, hardly any blank lines."""
+    lines: list[str] = ["# Transcript"]
+    size = 0
+    while size < target_chars:
+        line = f"[{rng.randint(0, 99):02d}:{rng.randint(0, 59):02d}] " + " ".join(
+            _sentence(rng, rng.randint(8, 30)) for _ in range(rng.randint(1, 40))
+        )
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def synthetic_vault(size_mb: float, seed: int = 42) -> list[str]:
+    rng = random.Random(seed)
+    target = int(size_mb * 1_000_000)
+    notes: list[str] = []
+    total = 0
+    while total < target:
+        if rng.random() < 0.01:
+            note = transcript_note(rng, rng.randint(1_000_000, 5_000_000))
+        else:
+            note = structured_note(rng, int(rng.lognormvariate(8, 1)))
+        notes.append(note)
+        total += len(note)
+    return notes
+
+
+def _bench(label: str, func, notes: list[str]) -> list[list[str]]:
+    start = time.perf_counter()
+    results = [func(note) for note in notes]
+    elapsed = time.perf_counter() - start
+    megabytes = sum(len(n) for n in notes) / 1e6
+    chunks = sum(len(r) for r in results)
+    print(f"{label:<28} {elapsed:8.2f} s {megabytes / elapsed:9.1f} MB/s {chunks:>10,d} chunks")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--size-mb", type=float, default=100)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--tokenizer", choices=["tiktoken", "words"], default="tiktoken")
+    args = parser.parse_args()
+
+    token_ends = tiktoken_token_ends if args.tokenizer == "tiktoken" else word_token_ends
+    if args.tokenizer == "tiktoken":
+        token_ends("warm up")  # Loads the encoding and vocabulary table outside the timings
+
+    notes = synthetic_vault(args.size_mb)
+    total = sum(len(n) for n in notes)
+    print(f"Synthetic vault: {len(notes):,d} notes, {total / 1e6:.1f} MB, "
+          f"largest note {max(len(n) for n in notes) / 1e6:.1f} MB, tokenizer={args.tokenizer}\n")
+
+    legacy = _bench("legacy chunk_text (chars)", legacy_chunk_text, notes)
+    markdown = _bench(
+        "chunk_markdown (tokens)",
+        lambda note: chunk_markdown(note, args.max_tokens, token_ends),
+        notes,
+    )
+
+    # Stage breakdown of the new engine
+    timings = {}
+    for label, func in [
+        ("tokenize", token_ends),
+        ("scan blocks", scan_blocks),
+        ("tokenize+scan+pack", lambda n: chunk_spans(n, args.max_tokens, token_ends)),
+    ]:
+        start = time.perf_counter()
+        for note in notes:
+            func(note)
+        timings[label] = time.perf_counter() - start
+    print("\nchunk_markdown stages: " + ", ".join(f"{k} {v:.2f} s" for k, v in timings.items()))
+
+    def token_stats(results: list[list[str]]) -> str:
+        counts = np.array([len(token_ends(c)) for chunks in results for c in chunks])
+        embedded = sum(len(c) for chunks in results for c in chunks)
+        return (
+            f"tokens/chunk mean {counts.mean():6.1f}  p95 {np.percentile(counts, 95):6.0f}  "
+            f"max {counts.max():5d}  | embedded chars {embedded / total:5.2f}x vault"
+        )
+
+    print("\nlegacy:   " + token_stats(legacy))
+    print("markdown: " + token_stats(markdown))
+
+
+if __name__ == "__main__":
+    main()
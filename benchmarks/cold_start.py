@@ -0,0 +1,85 @@
+"""
+Benchmark: cold start of `src.api.main:app`, from process start to first answers.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 3] [--question "What are my Docker notes?"]
+
+Starts uvicorn in a fresh process, once with the startup warm-up (API_WARMUP=true) and
+once without, and reports the median time until `/health` answers plus, with
+`--question`, the latency of the first and second `/ask`. Asking needs real Azure
+settings in the environment or `.env`; without them only startup is measured (dummy
+settings are filled in, so warm-up calls fail fast and are skipped).
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.import_time import DUMMY_ENV
+
+READY_TIMEOUT = 60.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(warmup: bool, question: str | None) -> dict[str, float]:
+    """Starts the API once and returns timings in seconds."""
+    port = _free_port()
+    env = {**DUMMY_ENV, **os.environ, "API_WARMUP": str(warmup).lower()}
+    start = time.perf_counter()
+    command = [sys.executable, "-m", "uvicorn", "src.api.main:app", "--port", str(port)]
+    server = subprocess.Popen([*command, "--log-level", "warning"], env=env)
+    base = f"http://127.0.0.1:{port}"
+    timings: dict[str, float] = {}
+    try:
+        with httpx.Client(base_url=base, timeout=120) as client:
+            while True:
+                try:
+                    client.get("/health").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if time.perf_counter() - start > READY_TIMEOUT or server.poll() is not None:
+                        raise RuntimeError("API did not come up") from None
+                    time.sleep(0.02)
+            timings["ready"] = time.perf_counter() - start
+
+            if question:
+                for label in ("first /ask", "second /ask"):
+                    begin = time.perf_counter()
+                    client.post("/ask", json={"question": question}).raise_for_status()
+                    timings[label] = time.perf_counter() - begin
+                    question += " "  # Same meaning, so the second ask may hit the answer cache
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--question", help="Also time /ask (needs real Azure settings)")
+    args = parser.parse_args()
+
+    for warmup in (False, True):
+        runs = [cold_start(warmup, args.question) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"warm-up {'on ' if warmup else 'off'}: " + "  ".join(
+            f"{key} {seconds * 1000:7.0f} ms" for key, seconds in medians.items()
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compare: recall, latency and storage of shortened embeddings (`EMBEDDING_DIMENSIONS`).
+
+Usage:
+    python -m benchmarks.embedding_dimensions [--dimensions 256 512 768 1024 1536]
+                                              [--limit 20000] [--queries 200] [--top-k 10]
+                                              [--synthetic]
+
+text-embedding-3 vectors are shortened by keeping their first values and rescaling to unit
+length, so every size can be evaluated from full-size vectors without new API calls. By
+default the vectors of your vault are read from the embedding cache (`EMBEDDING_CACHE_PATH`,
+filled by `build_index`); chunks sampled from it serve as queries, and each size is scored
+by recall@k of its nearest neighbours against those of the full-size vectors, plus search
+latency in the local index and the vector storage per chunk. `--synthetic` uses generated
+vectors whose variance decays over the dimensions, which only illustrates the trade-off.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from src.config import settings
+from src.ingestion.build_index import FULL_SIZE_DIMENSIONS
+from src.ingestion.embedding_cache import EmbeddingCache, model_key
+from src.retrieval.local_index import LocalVectorIndex, _unit_rows
+
+
+def cached_vectors(limit: int) -> np.ndarray:
+    """Full-size vectors from the embedding cache (the largest size found)."""
+    if not settings.embedding_cache_path:
+        sys.exit("The embedding cache is disabled (EMBEDDING_CACHE_PATH); use --synthetic")
+    cache = EmbeddingCache(settings.embedding_cache_path, max_bytes=settings.embedding_cache_max_mb << 20)
+    model = settings.azure_openai_embedding_deployment
+    keys = [model_key(model, size) for size in FULL_SIZE_DIMENSIONS] + [model]
+    samples = max((cache.sample(key, limit) for key in keys), key=lambda vectors: len(vectors[0]) if vectors else 0)
+    cache.close()
+    if not samples:
+        sys.exit("No cached embeddings found; run build_index first or use --synthetic")
+    return np.asarray(samples, dtype=np.float32)
+
+
+def synthetic_vectors(rng: np.random.Generator, chunks: int, dimensions: int = 1536) -> np.ndarray:
+    topics = rng.normal(size=(max(1, chunks // 50), dimensions))
+    vectors = topics[rng.integers(0, len(topics), chunks)] + 0.7 * rng.normal(size=(chunks, dimensions))
+    decay = 1 / np.sqrt(1 + np.arange(dimensions) / 64)  # Leading dimensions carry most signal
+    return vectors.astype(np.float32) * decay.astype(np.float32)
+
+
+def neighbours(index: LocalVectorIndex, queries: np.ndarray, rows: np.ndarray, top_k: int):
+    """Top-k rows per query (excluding the query chunk itself) and per-query latencies."""
+    results, latencies = [], []
+    for query, row in zip(queries, rows):
+        start = time.perf_counter()
+        hits = index.search(list(query), top_k + 1)
+        latencies.append(time.perf_counter() - start)
+        results.append([doc["id"] for doc, _ in hits if doc["id"] != row][:top_k])
+    return results, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 512, 768, 1024, 1536])
+    parser.add_argument("--limit", type=int, default=20_000, help="Chunks to load")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    full = synthetic_vectors(rng, args.limit) if args.synthetic else cached_vectors(args.limit)
+    documents = [{"id": i} for i in range(len(full))]
+    rows = rng.choice(len(full), size=min(args.queries, len(full)), replace=False)
+
+    sizes = sorted({d for d in args.dimensions if d <= full.shape[1]} | {full.shape[1]})
+    indexes = {d: LocalVectorIndex(_unit_rows(full[:, :d]), documents) for d in sizes}
+    truth, _ = neighbours(indexes[full.shape[1]], indexes[full.shape[1]].vectors[rows], rows, args.top_k)
+
+    source = "synthetic vectors" if args.synthetic else "embedding cache"
+    print(f"{len(full)} chunks ({source}), {len(rows)} queries, top {args.top_k}")
+    print(f"{'dimensions':>10} {'bytes/chunk':>12} {'p50':>9} {'recall@k':>9}")
+    for d in sizes:
+        index = indexes[d]
+        neighbours(index, index.vectors[rows[:5]], rows[:5], args.top_k)  # Warm up
+        results, latencies = neighbours(index, index.vectors[rows], rows, args.top_k)
+        recall = statistics.mean(len(set(got) & set(want)) / len(want) for got, want in zip(results, truth))
+        print(f"{d:>10} {d * 4:>12} {statistics.median(latencies) * 1000:6.2f} ms {recall:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: import time of the API, the part of a cold start that Python itself pays.
+
+Usage:
+    python -m benchmarks.import_time [--runs 7]
+
+Imports `src.api.main` in fresh interpreters and reports the median time, next to the
+same import followed by the SDKs that `src.retrieval.rag` only loads on first use
+(openai, azure-search-documents, numpy), which is what importing the API used to cost.
+Dummy Azure settings are filled in where the environment has none.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DUMMY_ENV = {
+    "AZURE_OPENAI_ENDPOINT": "https://dummy.openai.azure.com/",
+    "AZURE_OPENAI_API_KEY": "dummy-key",
+    "AZURE_SEARCH_SERVICE_ENDPOINT": "https://dummy.search.windows.net",
+    "AZURE_SEARCH_ADMIN_KEY": "dummy-key",
+    "AZURE_STORAGE_CONNECTION_STRING": (
+        "DefaultEndpointsProtocol=https;AccountName=dummy;AccountKey=ZHVtbXk=;"
+        "EndpointSuffix=core.windows.net"
+    ),
+}
+
+SCENARIOS = {
+    "import src.api.main": "import src.api.main",
+    "  + SDKs (eager, as before)": (
+        "import src.api.main, openai, azure.search.documents, "
+        "azure.search.documents.aio, azure.search.documents.models, numpy"
+    ),
+}
+
+
+def measure(statement: str, env: dict) -> tuple[float, float]:
+    """Runs `statement` in a fresh interpreter. Returns (import seconds, process seconds)."""
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output), time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    env = {**DUMMY_ENV, **os.environ}
+    print(f"{'scenario':<30} {'import (median)':>16} {'process (median)':>17}")
+    for label, statement in SCENARIOS.items():
+        measure(statement, env)  # Warm the OS file cache and __pycache__ first
+        runs = [measure(statement, env) for _ in range(args.runs)]
+        imports = statistics.median(r[0] for r in runs)
+        processes = statistics.median(r[1] for r in runs)
+        print(f"{label:<30} {imports * 1000:13.0f} ms {processes * 1000:14.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: int8 and binary quantization of the local vector index.
+
+Usage:
+    python -m benchmarks.quantization [--chunks 20000] [--dimensions 1536] [--queries 200] [--top-k 10]
+
+Generates a deterministic synthetic vault of clustered unit vectors (chunks of one topic
+lie close together, like embeddings of related notes) and queries near existing chunks,
+then reports for exact search, int8 and binary codes at several oversampling factors:
+the memory that has to stay resident for scoring, median and p95 latency per query, and
+recall@k against exact search. Rescoring reads the float32 rows of the candidates only.
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from src.retrieval import quantization
+from src.retrieval.local_index import LocalVectorIndex, _unit_rows
+
+CONFIGS = [
+    ("exact float32", "none", 1),
+    ("int8, no rescoring pool", "int8", 1),
+    ("int8, oversampling 4", "int8", 4),
+    ("binary, oversampling 4", "binary", 4),
+    ("binary, oversampling 16", "binary", 16),
+]
+
+
+def synthetic_vectors(rng: np.random.Generator, chunks: int, dimensions: int) -> np.ndarray:
+    topics = rng.normal(size=(max(1, chunks // 50), dimensions))
+    vectors = topics[rng.integers(0, len(topics), chunks)] + 0.5 * rng.normal(size=(chunks, dimensions))
+    return _unit_rows(vectors.astype(np.float32))
+
+
+def run(index: LocalVectorIndex, queries: np.ndarray, top_k: int) -> tuple[list[set], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(list(query), top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append({doc["id"] for doc, _ in hits})
+    return results, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = synthetic_vectors(rng, args.chunks, args.dimensions)
+    documents = [{"id": str(i)} for i in range(args.chunks)]
+    picks = rng.integers(0, args.chunks, args.queries)
+    queries = vectors[picks] + 0.02 * rng.normal(size=(args.queries, args.dimensions)).astype(np.float32)
+
+    print(f"{args.chunks} chunks x {args.dimensions} dimensions, {args.queries} queries, top {args.top_k}")
+    print(f"{'configuration':<26} {'resident':>10} {'p50':>9} {'p95':>9} {'recall@k':>9}")
+    truth = None
+    for label, kind, oversampling in CONFIGS:
+        codes = quantization.encode(vectors, kind) if kind != "none" else None
+        index = LocalVectorIndex(vectors, documents, codes=codes, oversampling=oversampling)
+        run(index, queries[:5], args.top_k)  # Warm up BLAS and caches
+        results, latencies = run(index, queries, args.top_k)
+        truth = truth or results
+        recall = statistics.mean(len(got & want) / len(want) for got, want in zip(results, truth))
+        resident = codes.nbytes if codes else vectors.nbytes
+        latencies.sort()
+        print(
+            f"{label:<26} {resident / 1e6:7.1f} MB {statistics.median(latencies) * 1000:6.2f} ms "
+            f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:6.2f} ms {recall:9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
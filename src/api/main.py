@@ -1,14 +1,50 @@
 """Phase 3 – FastAPI application: REST interface for the Obsidian Cloud Brain."""
 
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from src.retrieval.rag import ask
+from src.config import get_settings
+from src.retrieval.rag import (
+    aask,
+    aask_stream,
+    aclose_clients,
+    awarm_up,
+    cache_stats,
+    retrieval_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The RAG clients are created on first use; on a cold start (scale from zero) the
+    # warm-up creates them before traffic arrives. Shutdown closes their connection pools.
+    app.state.warmup = {}
+    settings = get_settings()
+    if settings.api_warmup:
+        start = time.perf_counter()
+        app.openapi()  # Builds the OpenAPI schema of all models once, ahead of /docs
+        timings = {"openapi": time.perf_counter() - start}
+        timings |= await awarm_up(timeout=settings.api_warmup_timeout_seconds)
+        app.state.warmup = {step: round(seconds, 3) for step, seconds in timings.items()}
+        logger.info("Warm-up finished: %s", app.state.warmup)
+    yield
+    await aclose_clients()
+
 
 app = FastAPI(
     title="Obsidian Cloud Brain API",
     description="Ask questions about your Obsidian notes via a RAG pipeline on Azure.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -41,6 +77,15 @@ async def health() -> dict:
     return {"status": "healthy", "version": app.version}
 
 
+@app.get("/stats", summary="Retrieval cache, latency and startup warm-up statistics")
+async def stats() -> dict:
+    return {
+        "caches": cache_stats(),
+        "retrieval_latency": retrieval_stats(),
+        "warmup_seconds": getattr(app.state, "warmup", {}),
+    }
+
+
 @app.post("/ask", response_model=AskResponse, summary="Ask a question about your notes")
 async def ask_endpoint(request: AskRequest) -> AskResponse:
     """
@@ -51,10 +96,40 @@ async def ask_endpoint(request: AskRequest) -> AskResponse:
     - Returns the answer and the sources.
     """
     try:
-        result = ask(request.question, top_k=request.top_k)
+        result = await aask(request.question, top_k=request.top_k)
         return AskResponse(
             answer=result["answer"],
             sources=[Source(**s) for s in result["sources"]],
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+def _sse(event: str, data) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _event_stream(request: AskRequest) -> AsyncIterator[str]:
+    try:
+        async for event in aask_stream(request.question, top_k=request.top_k):
+            yield _sse(event["event"], event["data"])
+    except Exception as exc:
+        # Headers are already sent, so errors are reported in-band
+        yield _sse("error", {"detail": str(exc)})
+
+
+@app.post("/ask/stream", summary="Ask a question and stream the answer (Server-Sent Events)")
+async def ask_stream_endpoint(request: AskRequest) -> StreamingResponse:
+    """
+    Streaming variant of `/ask`. Emits, as `text/event-stream`:
+
+    - `sources`: the retrieved sources, as soon as the search completes.
+    - `token`: answer fragments while **GPT-4o** generates them.
+    - `done` when the answer is complete, or `error` if something failed mid-stream.
+    """
+    return StreamingResponse(
+        _event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,7 +1,12 @@
 """Central configuration via pydantic-settings (loads from .env or environment variables)."""
 
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Native output size of text-embedding-3-small and text-embedding-ada-002
+DEFAULT_EMBEDDING_DIMENSIONS = 1536
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
@@ -11,18 +16,92 @@ class Settings(BaseSettings):
     azure_openai_api_key: str
     azure_openai_deployment_name: str = "gpt-4o"
     azure_openai_embedding_deployment: str = "text-embedding-3-small"
+    embedding_dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS  # Vector size; text-embedding-3 can return fewer
+    # Size the deployment's model returns without `dimensions` (3072 for text-embedding-3-large)
+    embedding_model_dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS
+
+    # Client-side quota of the embedding deployment, shared by indexer and API (0 disables)
+    embedding_tpm_quota: int = 120_000
+    embedding_rpm_quota: int = 720
+    embedding_max_concurrency: int = 8         # Upper bound for in-flight embeddings requests
+    rate_limit_max_retries: int = 6            # Retries of a throttled (429) request
 
     # Azure AI Search
     azure_search_service_endpoint: str
     azure_search_admin_key: str
     azure_search_index_name: str = "obsidian-notes"
 
+    # Retrieval
+    retrieval_backend: str = "azure"           # "azure" (Azure AI Search) or "local" (in-process)
+    local_index_path: str = ".cache/local_index"  # Written by build_index --backend local
+    local_index_hnsw: bool = False             # Approximate HNSW search (needs hnswlib)
+    vector_quantization: str = "none"          # "none", "int8" or "binary" (binary: local index only)
+    vector_oversampling: float = 4.0           # Quantized candidates rescored in full precision per result
+    retrieval_fusion: str = "rrf"              # "rrf" (reciprocal rank) or "weighted" (normalized scores)
+    retrieval_candidates: int = 50             # Candidates fetched per side before fusion (min. top_k)
+    retrieval_keyword_weight: float = 1.0      # Weight of the keyword side (0 skips it)
+    retrieval_vector_weight: float = 1.0       # Weight of the vector side (0 skips it)
+    retrieval_rrf_k: int = 60                  # RRF rank constant; higher flattens rank differences
+    query_cache_max_entries: int = 1024        # Cached query embeddings (0 disables)
+    query_cache_ttl_seconds: float = 3600
+    semantic_cache_max_entries: int = 512      # Cached answers for /ask (0 disables)
+    semantic_cache_ttl_seconds: float = 600
+    semantic_cache_threshold: float = 0.93     # Min. cosine similarity to reuse an answer
+
+    # API
+    api_warmup: bool = True                    # Open client connections at startup
+    api_warmup_timeout_seconds: float = 10     # Per warm-up call
+
     # Azure Storage
     azure_storage_connection_string: str
     azure_storage_container_name: str = "obsidian-vault"
 
     # Local path (ingestion only)
     obsidian_vault_path: str = ""
+    upload_workers: int = 8                    # Parallel blob uploads in upload_vault
+
+    # Indexing
+    chunk_max_tokens: int = 512                # Token budget per chunk (cl100k_base tokens)
+    chunk_stream_window_chars: int = 1_000_000 # Text buffered per note while chunking a stream
+    blob_download_chunk_bytes: int = 4 * 1024 * 1024  # Ranged GET size for blob downloads
+    embedding_batch_max_items: int = 64        # Inputs per embeddings request
+    embedding_batch_max_tokens: int = 32_000   # Estimated tokens per embeddings request
+    index_download_workers: int = 8            # Pipelined mode: concurrent blob downloads
+    index_embed_workers: int = 4               # Pipelined mode: concurrent embeddings requests
+    index_upload_workers: int = 2              # Concurrent search upload requests
+    index_queue_size: int = 256                # Pipelined mode: max items waiting between stages
+    upload_batch_max_bytes: int = 8 * 1024 * 1024  # Serialized size per upload request (limit 16 MB)
+    upload_max_retries: int = 5                # Retries of documents that failed transiently
+    delete_batch_size: int = 1000              # Documents per delete request (service max. 1000)
+    index_delete_workers: int = 4              # Concurrent delete requests
+    embedding_cache_path: str = ".cache/embeddings.sqlite"  # Empty string disables the cache
+    embedding_cache_max_mb: int = 1024
+    index_checkpoint_path: str = ".cache/index_checkpoint.sqlite"  # Empty string disables resuming
+    index_keep_versions: int = 2               # Blue/green: index versions kept (live + rollback)
+    index_swap_min_ratio: float = 0.5          # Blue/green: min. new/live document ratio to swap
+    index_swap_count_timeout_seconds: float = 120  # Blue/green: wait for the document count to settle
+
+    def embedding_options(self, dimensions: int | None = None) -> dict:
+        """
+        Extra arguments for embeddings requests of `dimensions` values (default:
+        `embedding_dimensions`). `dimensions` is only sent when it differs from the model's
+        native size, because text-embedding-ada-002 deployments reject the parameter.
+        """
+        dimensions = dimensions or self.embedding_dimensions
+        if dimensions == self.embedding_model_dimensions:
+            return {}
+        return {"dimensions": dimensions}
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Returns the settings, read from the environment on first use."""
+    return Settings()  # type: ignore[call-arg]
 
 
-settings = Settings()  # type: ignore[call-arg]
+def __getattr__(name: str):
+    # `from src.config import settings` keeps working, but only reads the environment
+    # when a module actually asks for it
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
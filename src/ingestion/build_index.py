@@ -2,24 +2,46 @@
 Phase 2 – Vector Index: Create embeddings from your notes and store them in Azure AI Search.
 
 Usage:
-    python -m src.ingestion.build_index
+    python -m src.ingestion.build_index [--pipelined] [--incremental | --blue-green] [--fresh]
+                                        [--backend {azure,local}]
 
 What this script does:
-  1. Fetches all blobs from Azure Blob Storage.
-  2. Splits long notes into smaller chunks (for better retrieval).
-  3. Generates embeddings via Azure OpenAI (text-embedding-3-small).
+  1. Fetches all blobs from Azure Blob Storage (with --incremental: only new or changed
+     notes, detected via the `md5` blob metadata).
+  2. Splits long notes into token-bounded chunks along Markdown headings, paragraphs
+     and code blocks (for better retrieval).
+  3. Generates embeddings via Azure OpenAI (text-embedding-3-small), many chunks per request.
   4. Indexes the chunks with vectors in Azure AI Search.
+
+With --blue-green the chunks go into a new index version; the configured index name
+becomes an alias that is switched to the new version only after it has been validated.
+
+Progress is checkpointed per blob; an interrupted build resumes where it stopped
+(use --fresh to start over).
+
+With --backend local the chunks go into an in-process vector index on disk
+(`local_index_path`) instead of Azure AI Search; see `src.retrieval.local_index`.
 """
 
+import argparse
 import base64
+import codecs
+import json
 import logging
+import threading
 import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     HnswAlgorithmConfiguration,
+    ScalarQuantizationCompressionConfiguration,
+    ScalarQuantizationParameters,
     SearchField,
     SearchFieldDataType,
     SearchIndex,
@@ -28,137 +50,742 @@ from azure.search.documents.indexes.models import (
     VectorSearch,
     VectorSearchProfile,
 )
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContainerClient
 from openai import AzureOpenAI
 
 from src.config import settings
+from src.ingestion.checkpoint import BuildJournal
+from src.ingestion.chunking import chunk_markdown, chunk_markdown_stream
+from src.ingestion.deletion import delete_ids, delete_sources, iter_documents, iter_ids
+from src.ingestion.embedding_cache import EmbeddingCache, model_key, shorten
+from src.ingestion.index_versions import (
+    new_version_name,
+    prune_versions,
+    resolve_index_name,
+    swap_alias,
+    validate_version,
+    wait_for_document_count,
+)
+from src.ingestion.pipeline import Stage, run_pipeline
+from src.ratelimit import embedding_limiter, estimate_tokens
+from src.retrieval.local_index import LocalIndexWriter, LocalVectorIndex
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
-CHUNK_SIZE = 1000      # Characters per chunk
-CHUNK_OVERLAP = 100    # Overlap to preserve context between chunks
+MAX_UPLOAD_BATCH_DOCS = 1000                   # Service limit for actions per indexing request
+RETRYABLE_UPLOAD_STATUS = {409, 422, 429, 503}  # Per-document statuses worth retrying
+_UPLOAD_ACTION_OVERHEAD = 32                   # Bytes the SDK adds per document ("@search.action")
+FULL_SIZE_DIMENSIONS = (3072, 1536)            # Native sizes of text-embedding-3-large / -small
+
+_embedding_cache: EmbeddingCache | None = None
+_embedding_cache_lock = threading.Lock()
+
+
+def chunk_text(text: str, max_tokens: int | None = None) -> list[str]:
+    """Splits a Markdown note into token-bounded chunks that carry their heading path."""
+    return chunk_markdown(text, max_tokens=max_tokens or settings.chunk_max_tokens)
 
 
-def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
-    """Splits text into overlapping chunks."""
-    chunks, start = [], 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+def chunk_text_stream(pieces: Iterable[str], max_tokens: int | None = None) -> Iterator[str]:
+    """Like `chunk_text`, for a note that arrives as a stream of decoded text pieces."""
+    return chunk_markdown_stream(
+        pieces,
+        max_tokens=max_tokens or settings.chunk_max_tokens,
+        window=settings.chunk_stream_window_chars,
+    )
+
+
+def vector_compressions() -> list[ScalarQuantizationCompressionConfiguration]:
+    """
+    Compression of the vector field for `vector_quantization`: int8 scalar quantization,
+    with the original vectors kept for rescoring the oversampled candidates.
+    """
+    kind = settings.vector_quantization
+    if kind == "none":
+        return []
+    if kind != "int8":
+        # Binary quantization needs a newer azure-search-documents than the pinned one
+        raise ValueError(f"Vector quantization {kind!r} is only supported by the local index")
+    return [
+        ScalarQuantizationCompressionConfiguration(
+            name="int8-compression",
+            rerank_with_original_vectors=True,
+            default_oversampling=settings.vector_oversampling,
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+        )
+    ]
 
 
-def ensure_index(index_client: SearchIndexClient) -> None:
-    """Creates the Azure AI Search index if it does not exist yet."""
+def ensure_index(index_client: SearchIndexClient, name: str | None = None) -> None:
+    """Creates the Azure AI Search index (default: the configured one) if it does not exist yet."""
+    name = name or settings.azure_search_index_name
     fields = [
-        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+        # Sortable and filterable ids allow keyset paging over large indexes
+        SimpleField(
+            name="id", type=SearchFieldDataType.String, key=True, filterable=True, sortable=True
+        ),
         SearchableField(name="title", type=SearchFieldDataType.String),
         SearchableField(name="content", type=SearchFieldDataType.String),
         SimpleField(name="tags", type=SearchFieldDataType.String),
         SimpleField(name="source_path", type=SearchFieldDataType.String, filterable=True),
         SimpleField(name="chunk_index", type=SearchFieldDataType.Int32),
+        SimpleField(name="content_md5", type=SearchFieldDataType.String, filterable=True),
         SearchField(
             name="content_vector",
             type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
             searchable=True,
-            vector_search_dimensions=1536,
+            vector_search_dimensions=settings.embedding_dimensions,
             vector_search_profile_name="hnsw-profile",
         ),
     ]
 
+    compressions = vector_compressions()
     vector_search = VectorSearch(
         algorithms=[HnswAlgorithmConfiguration(name="hnsw-algo")],
-        profiles=[VectorSearchProfile(name="hnsw-profile", algorithm_configuration_name="hnsw-algo")],
+        compressions=compressions,
+        profiles=[
+            VectorSearchProfile(
+                name="hnsw-profile",
+                algorithm_configuration_name="hnsw-algo",
+                compression_configuration_name=compressions[0].name if compressions else None,
+            )
+        ],
     )
 
     index = SearchIndex(
-        name=settings.azure_search_index_name,
+        name=name,
         fields=fields,
         vector_search=vector_search,
     )
 
-    existing = [i.name for i in index_client.list_indexes()]
-    if settings.azure_search_index_name not in existing:
+    existing = {i.name: i for i in index_client.list_indexes()}
+    if name not in existing:
         index_client.create_index(index)
-        logger.info("Index created: %s", settings.azure_search_index_name)
+        logger.info("Index created: %s", name)
+        return
+
+    current = existing[name]
+    current_vector = next((f for f in current.fields if f.name == "content_vector"), None)
+    if current_vector and current_vector.vector_search_dimensions != settings.embedding_dimensions:
+        # Vector sizes cannot be changed in place, and mixed sizes cannot be searched
+        raise ValueError(
+            f"Index {name} holds {current_vector.vector_search_dimensions}-dimensional vectors, "
+            f"but EMBEDDING_DIMENSIONS={settings.embedding_dimensions}; migrate with --blue-green"
+        )
+    current_compressions = {c.name for c in (current.vector_search and current.vector_search.compressions) or []}
+    if current_compressions != {c.name for c in compressions}:
+        # The compression of an existing vector field cannot be changed in place
+        logger.warning(
+            "Index %s uses vector compression %s, but VECTOR_QUANTIZATION=%s; "
+            "rebuild with --blue-green to apply it.",
+            name, sorted(current_compressions) or "none", settings.vector_quantization,
+        )
+    missing = {f.name for f in fields} - {f.name for f in current.fields}
+    if missing:
+        # Azure AI Search allows adding fields to an existing index in place
+        current.fields.extend(f for f in fields if f.name in missing)
+        index_client.create_or_update_index(current)
+        logger.info("Index updated with new fields %s: %s", sorted(missing), name)
     else:
-        logger.info("Index already exists: %s", settings.azure_search_index_name)
+        logger.info("Index already exists: %s", name)
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Opens the on-disk embedding cache on first use. Returns None when it is disabled."""
+    global _embedding_cache
+    if not settings.embedding_cache_path:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(
+                settings.embedding_cache_path,
+                max_bytes=settings.embedding_cache_max_mb * 1024 * 1024,
+            )
+    return _embedding_cache
 
 
 def get_embedding(openai_client: AzureOpenAI, text: str) -> list[float]:
     """Calls Azure OpenAI to generate an embedding vector."""
-    response = openai_client.embeddings.create(
-        model=settings.azure_openai_embedding_deployment,
-        input=text,
+    return get_embeddings(openai_client, [text])[0]
+
+
+def cached_embeddings(
+    cache: EmbeddingCache, model: str, dimensions: int, texts: list[str]
+) -> list[list[float] | None]:
+    """
+    Looks up vectors of `dimensions` values. Longer vectors of the same text (cached at a
+    larger size, or under the bare model name before the size was configurable) are
+    shortened instead, so reducing `embedding_dimensions` needs no new embeddings.
+    """
+    vectors = cache.get_many(model_key(model, dimensions), texts)
+    longer = [model_key(model, size) for size in FULL_SIZE_DIMENSIONS if size > dimensions]
+    for key in [*longer, model]:
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if not missing:
+            break
+        for i, vector in zip(missing, cache.get_many(key, [texts[i] for i in missing])):
+            if vector is not None and len(vector) >= dimensions:
+                vectors[i] = shorten(vector, dimensions) if len(vector) > dimensions else vector
+    return vectors
+
+
+def get_embeddings(openai_client: AzureOpenAI, texts: list[str]) -> list[list[float]]:
+    """
+    Embeds several texts with `embedding_dimensions` values each, preserving input order.
+    Vectors found in the embedding cache are reused; the remaining texts are sent to
+    Azure OpenAI in a single request.
+    """
+    if not texts:
+        return []
+    model = settings.azure_openai_embedding_deployment
+    dimensions = settings.embedding_dimensions
+    cache = get_embedding_cache()
+    vectors = cached_embeddings(cache, model, dimensions, texts) if cache else [None] * len(texts)
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        inputs = [texts[i] for i in missing]
+        response = embedding_limiter().call_raw(
+            openai_client.embeddings.with_raw_response.create,
+            model=model,
+            input=inputs,
+            **settings.embedding_options(),
+            tokens=sum(estimate_tokens(text) for text in inputs),
+        )
+        fresh = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        for i, vector in zip(missing, fresh, strict=True):
+            vectors[i] = vector
+        if cache:
+            cache.put_many(model_key(model, dimensions), [texts[i] for i in missing], fresh)
+    return vectors
+
+
+def batch_by_budget(
+    docs: Iterable[dict],
+    max_items: int | None = None,
+    max_tokens: int | None = None,
+) -> Iterator[list[dict]]:
+    """Groups chunk documents into batches bounded by an item count and a token budget."""
+    max_items = max_items or settings.embedding_batch_max_items
+    max_tokens = max_tokens or settings.embedding_batch_max_tokens
+
+    batch: list[dict] = []
+    batch_tokens = 0
+    for doc in docs:
+        tokens = estimate_tokens(doc["content"])
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(doc)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def embed_documents(openai_client: AzureOpenAI, docs: list[dict]) -> dict[str, list[float]]:
+    """Embeds a batch of chunk documents in one request. Returns vectors keyed by document id."""
+    vectors = get_embeddings(openai_client, [doc["content"] for doc in docs])
+    return {doc["id"]: vector for doc, vector in zip(docs, vectors, strict=True)}
+
+
+def blob_md5(blob) -> str:
+    """
+    Returns the content hash of a blob: the `md5` metadata written by upload_vault, or
+    the hex-encoded Content-MD5 computed by Azure Storage as a fallback.
+    """
+    metadata = blob.metadata or {}
+    if metadata.get("md5"):
+        return metadata["md5"]
+    content_md5 = blob.content_settings.content_md5 if blob.content_settings else None
+    return bytes(content_md5).hex() if content_md5 else ""
+
+
+def iter_note_text(container: ContainerClient, blob) -> Iterator[str]:
+    """
+    Streams a blob in ranged chunks through an incremental UTF-8 decoder, so a note
+    never has to be held in memory as bytes and text at the same time.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for data in container.get_blob_client(blob.name).download_blob().chunks():
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def chunk_documents(blob, pieces: Iterable[str]) -> list[dict]:
+    """
+    Chunks a note, given as a stream of text pieces, and wraps each chunk as an index
+    document (without vector). The documents of the note are returned together, since
+    the journal records all chunk ids of a blob up front.
+    """
+    metadata = blob.metadata or {}
+    title = metadata.get("title", blob.name)
+    tags = metadata.get("tags", "")
+
+    docs = []
+    for i, chunk in enumerate(chunk_text_stream(pieces)):
+        raw_id = f"{blob.name.replace('.md', '')}_{i}"
+        docs.append({
+            "id": base64.urlsafe_b64encode(raw_id.encode()).decode(),
+            "title": title,
+            "content": chunk,
+            "tags": tags,
+            "source_path": blob.name,
+            "chunk_index": i,
+            "content_md5": blob_md5(blob),
+        })
+    return docs
+
+
+def download_and_chunk(
+    container: ContainerClient, blob, journal: BuildJournal | None = None
+) -> list[dict]:
+    """Streams one blob into the chunker and records its chunks in the journal."""
+    docs = chunk_documents(blob, iter_note_text(container, blob))
+    if journal:
+        journal.record_chunks(blob.name, blob_md5(blob), docs)
+    return docs
+
+
+def iter_chunk_documents(
+    container: ContainerClient, blobs: Iterable, journal: BuildJournal | None = None
+) -> Iterator[dict]:
+    """Downloads each blob and yields its chunks as index documents (without vectors)."""
+    for blob in blobs:
+        yield from download_and_chunk(container, blob, journal)
+
+
+def attach_embeddings(
+    openai_client: AzureOpenAI, docs: list[dict], journal: BuildJournal | None = None
+) -> list[dict]:
+    """Embeds a batch of documents in one request and stores each vector on its document."""
+    vectors = embed_documents(openai_client, docs)
+    for doc in docs:
+        doc["content_vector"] = vectors[doc["id"]]
+    if journal:
+        journal.record_embedded(docs)
+    return docs
+
+
+def iter_embedded_documents(
+    openai_client: AzureOpenAI, docs: Iterable[dict], journal: BuildJournal | None = None
+) -> Iterator[dict]:
+    """Attaches a content vector to every document, embedding them in budgeted batches."""
+    for group in batch_by_budget(docs):
+        yield from attach_embeddings(openai_client, group, journal)
+
+
+def serialized_size(doc: dict) -> int:
+    """Size of a document in an indexing request body, in bytes."""
+    return len(json.dumps(doc, separators=(",", ":")).encode("utf-8")) + _UPLOAD_ACTION_OVERHEAD
+
+
+def batch_by_bytes(
+    docs: Iterable[dict],
+    max_bytes: int | None = None,
+    max_items: int = MAX_UPLOAD_BATCH_DOCS,
+) -> Iterator[list[dict]]:
+    """
+    Groups documents into upload batches bounded by their serialized size, since the
+    payload (vectors dominate it), not the document count, hits the request size limit.
+    """
+    max_bytes = max_bytes or settings.upload_batch_max_bytes
+    batch: list[dict] = []
+    batch_bytes = 0
+    for doc in docs:
+        size = serialized_size(doc)
+        if batch and (len(batch) >= max_items or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(doc)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def upload_batch(
+    search_client: SearchClient, batch: list[dict], journal: BuildJournal | None = None
+) -> list[str]:
+    """
+    Uploads one batch of documents to the search index and retries only the documents
+    that failed with a transient status. Returns the uploaded ids.
+    """
+    pending = {doc["id"]: doc for doc in batch}
+    uploaded: list[str] = []
+    for attempt in range(settings.upload_max_retries + 1):
+        if attempt:
+            time.sleep(min(30.0, 2.0 ** attempt))
+            logger.info("Retrying %d failed documents (attempt %d).", len(pending), attempt)
+        results = search_client.upload_documents(list(pending.values()))
+
+        succeeded = [pending.pop(r.key) for r in results if r.succeeded]
+        if journal:
+            journal.record_uploaded(succeeded)
+        uploaded += [doc["id"] for doc in succeeded]
+
+        permanent = [
+            r for r in results
+            if not r.succeeded and r.status_code not in RETRYABLE_UPLOAD_STATUS
+        ]
+        if permanent:
+            raise RuntimeError(
+                f"{len(permanent)} documents were rejected by the index, e.g. "
+                f"{permanent[0].key}: {permanent[0].status_code} {permanent[0].error_message}"
+            )
+        if not pending:
+            break
+    else:
+        raise RuntimeError(
+            f"{len(pending)} documents still failing after retries, e.g. {sorted(pending)[:5]}"
+        )
+
+    logger.info("Indexed batch of %d documents.", len(uploaded))
+    return uploaded
+
+
+def fetch_indexed_notes(search_client: SearchClient) -> dict[str, dict]:
+    """
+    Reads the current index state per note:
+    {source_path: {"md5": set of content hashes, "ids": list of chunk ids}}.
+    """
+    notes: dict[str, dict] = {}
+    for doc in iter_documents(search_client, ["source_path", "content_md5"]):
+        note = notes.setdefault(doc["source_path"], {"md5": set(), "ids": []})
+        note["md5"].add(doc.get("content_md5") or "")
+        note["ids"].append(doc["id"])
+    return notes
+
+
+def plan_incremental(blobs: list, indexed: dict[str, dict]) -> tuple[list, list[str]]:
+    """
+    Compares blob hashes with the index state.
+    Returns (blobs to (re-)index, source paths that no longer exist as blobs).
+    """
+    changed = [
+        blob for blob in blobs
+        if not blob_md5(blob) or indexed.get(blob.name, {}).get("md5") != {blob_md5(blob)}
+    ]
+    blob_names = {blob.name for blob in blobs}
+    removed = [path for path in indexed if path not in blob_names]
+    return changed, removed
+
+
+def skip_done(blobs: Iterable, journal: BuildJournal | None) -> Iterable:
+    """Filters out blobs that an interrupted run of this build already uploaded."""
+    if journal is None:
+        return blobs
+    return (blob for blob in blobs if not journal.is_done(blob.name, blob_md5(blob)))
+
+
+def index_serial(
+    container: ContainerClient,
+    blobs: Iterable,
+    search_client: SearchClient,
+    openai_client: AzureOpenAI,
+    journal: BuildJournal | None = None,
+) -> list[str]:
+    """
+    Downloads, chunks and embeds one step at a time, with up to `index_upload_workers`
+    upload batches in flight. Returns the indexed ids.
+    """
+    indexed: list[str] = []
+    documents = iter_embedded_documents(
+        openai_client, iter_chunk_documents(container, blobs, journal), journal
     )
-    return response.data[0].embedding
+    workers = max(1, settings.index_upload_workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for batch in batch_by_bytes(documents):
+            in_flight.append(pool.submit(upload_batch, search_client, batch, journal))
+            if len(in_flight) >= workers:
+                indexed += in_flight.popleft().result()
+        for future in in_flight:
+            indexed += future.result()
+    return indexed
 
 
-def run() -> None:
-    blob_service = BlobServiceClient.from_connection_string(settings.azure_storage_connection_string)
-    container = blob_service.get_container_client(settings.azure_storage_container_name)
+def index_pipelined(
+    container: ContainerClient,
+    blobs: Iterable,
+    search_client: SearchClient,
+    openai_client: AzureOpenAI,
+    journal: BuildJournal | None = None,
+) -> list[str]:
+    """
+    Runs download, chunking, embedding and upload as concurrent stages connected by
+    bounded queues, so network-bound stages overlap. Returns the indexed ids.
+    """
+    stages = [
+        # Each worker streams one blob straight into the chunker
+        Stage(
+            "download+chunk",
+            lambda blob: download_and_chunk(container, blob, journal),
+            workers=settings.index_download_workers,
+        ),
+        Stage("embed-batching", batch_by_budget, stream=True),
+        Stage(
+            "embed",
+            lambda group: [attach_embeddings(openai_client, group, journal)],
+            workers=settings.index_embed_workers,
+        ),
+        Stage(
+            "upload-batching",
+            lambda groups: batch_by_bytes(chain.from_iterable(groups)),
+            stream=True,
+        ),
+        Stage(
+            "upload",
+            lambda batch: upload_batch(search_client, batch, journal),
+            workers=settings.index_upload_workers,
+        ),
+    ]
+    return run_pipeline(blobs, stages, queue_size=settings.index_queue_size)
 
-    credential = AzureKeyCredential(settings.azure_search_admin_key)
-    index_client = SearchIndexClient(settings.azure_search_service_endpoint, credential)
-    search_client = SearchClient(
-        settings.azure_search_service_endpoint,
-        settings.azure_search_index_name,
-        credential,
+
+def index_full(
+    container: ContainerClient,
+    search_client: SearchClient,
+    openai_client: AzureOpenAI,
+    index,
+    journal: BuildJournal | None,
+) -> int:
+    """Re-indexes every blob and prunes documents that were not re-indexed. Returns the count."""
+    # Documents are overwritten in place and stale ones pruned at the end, so the
+    # index stays fully searchable during (and after an interrupted) rebuild
+    existing_ids = list(iter_ids(search_client))
+
+    # Listing pages are consumed lazily, so indexing starts with the first page
+    blobs = skip_done(container.list_blobs(include=["metadata"]), journal)
+    kept = set(index(container, blobs, search_client, openai_client, journal))
+    if journal:
+        kept |= journal.uploaded_ids()
+    deleted = delete_ids(
+        search_client,
+        (i for i in existing_ids if i not in kept),
+        batch_size=settings.delete_batch_size,
+        workers=settings.index_delete_workers,
+    )
+    logger.info(
+        "Indexing complete. Documents indexed: %d | Deleted: %d | Resumed notes: %d",
+        len(kept), deleted, journal.skipped if journal else 0,
+    )
+    return len(kept)
+
+
+def index_incremental(
+    container: ContainerClient,
+    search_client: SearchClient,
+    openai_client: AzureOpenAI,
+    index,
+    journal: BuildJournal | None,
+) -> None:
+    """Re-indexes new or changed blobs and deletes chunks of removed ones."""
+    blobs = list(container.list_blobs(include=["metadata"]))
+    indexed_notes = fetch_indexed_notes(search_client)
+    changed, removed = plan_incremental(blobs, indexed_notes)
+    logger.info(
+        "Blobs: %d | Changed or new: %d | Removed: %d | Unchanged: %d",
+        len(blobs), len(changed), len(removed), len(blobs) - len(changed),
+    )
+
+    pending = skip_done(changed, journal)
+    new_ids = set(index(container, pending, search_client, openai_client, journal))
+    if journal:
+        new_ids |= journal.uploaded_ids()
+
+    # Drop chunks of removed notes, and trailing chunks of notes that got shorter
+    deleted = delete_sources(
+        search_client,
+        removed,
+        batch_size=settings.delete_batch_size,
+        workers=settings.index_delete_workers,
+    )
+    stale_ids = [
+        doc_id
+        for blob in changed
+        for doc_id in indexed_notes.get(blob.name, {}).get("ids", [])
+        if doc_id not in new_ids
+    ]
+    deleted += delete_ids(
+        search_client,
+        stale_ids,
+        batch_size=settings.delete_batch_size,
+        workers=settings.index_delete_workers,
+    )
+    logger.info("Incremental indexing complete. Indexed: %d | Deleted: %d", len(new_ids), deleted)
+
+
+def index_local(container: ContainerClient, openai_client: AzureOpenAI, incremental: bool) -> None:
+    """
+    Builds the local vector index at `local_index_path`. Incremental builds start from
+    the existing index and only embed new or changed notes.
+    """
+    path = settings.local_index_path
+    existing = LocalVectorIndex.load(path) if incremental and LocalVectorIndex.exists(path) else None
+    if existing is not None and existing.dimensions not in (0, settings.embedding_dimensions):
+        logger.info(
+            "Local index has %d-dimensional vectors, EMBEDDING_DIMENSIONS=%d: rebuilding it",
+            existing.dimensions, settings.embedding_dimensions,
+        )
+        existing = None
+    writer = LocalIndexWriter(existing)
+
+    blobs = list(container.list_blobs(include=["metadata"]))
+    changed, removed = plan_incremental(blobs, writer.notes())
+    deleted = writer.delete_sources([*removed, *(blob.name for blob in changed)])
+    docs = iter_embedded_documents(openai_client, iter_chunk_documents(container, changed))
+    writer.add(docs)
+
+    writer.build().save(
+        path, hnsw=settings.local_index_hnsw, quantization_kind=settings.vector_quantization
+    )
+    logger.info(
+        "Local index written to %s. Chunks: %d | Re-indexed notes: %d | Removed chunks: %d",
+        path, len(writer), len(changed), deleted,
+    )
+
+
+def run(
+    pipelined: bool = False,
+    incremental: bool = False,
+    fresh: bool = False,
+    blue_green: bool = False,
+    backend: str = "azure",
+) -> None:
+    if incremental and blue_green:
+        raise ValueError("Blue/green builds always re-index the whole vault")
+    if backend == "local" and blue_green:
+        raise ValueError("Blue/green builds need the Azure AI Search backend")
+
+    blob_service = BlobServiceClient.from_connection_string(
+        settings.azure_storage_connection_string,
+        max_single_get_size=settings.blob_download_chunk_bytes,
+        max_chunk_get_size=settings.blob_download_chunk_bytes,
     )
+    container = blob_service.get_container_client(settings.azure_storage_container_name)
     openai_client = AzureOpenAI(
         azure_endpoint=settings.azure_openai_endpoint,
         api_key=settings.azure_openai_api_key,
         api_version="2024-02-01",
+        max_retries=0,  # 429s are retried by the embedding rate limiter
     )
 
-    ensure_index(index_client)
+    if backend == "local":
+        # The index file is only written once complete, so there is no partial state to
+        # resume; unchanged chunks come from the embedding cache on a rebuild
+        index_local(container, openai_client, incremental)
+        _log_cache_stats()
+        return
 
-    # Delete all existing documents so removed blobs are no longer searchable
-    existing_docs = list(search_client.search("*", select=["id"]))
-    if existing_docs:
-        search_client.delete_documents(existing_docs)
-        logger.info("Cleared %d existing documents from index.", len(existing_docs))
+    credential = AzureKeyCredential(settings.azure_search_admin_key)
+    index_client = SearchIndexClient(settings.azure_search_service_endpoint, credential)
 
-    blobs = list(container.list_blobs())
-    logger.info("Blobs to index: %d", len(blobs))
+    # The configured name is either a concrete index or the alias of a blue/green build
+    alias = settings.azure_search_index_name
+    live_index = resolve_index_name(index_client, alias)
+    mode = "blue-green" if blue_green else "incremental" if incremental else "full"
+    journal = BuildJournal(settings.index_checkpoint_path) if settings.index_checkpoint_path else None
 
-    batch: list[dict] = []
-    for blob in blobs:
-        blob_client = container.get_blob_client(blob.name)
-        content = blob_client.download_blob().readall().decode("utf-8")
-        metadata = blob.metadata or {}
-        title = metadata.get("title", blob.name)
-        tags = metadata.get("tags", "")
-
-        for i, chunk in enumerate(chunk_text(content)):
-            raw_id = f"{blob.name.replace('.md', '')}_{i}"
-            doc_id = base64.urlsafe_b64encode(raw_id.encode()).decode()
-            vector = get_embedding(openai_client, chunk)
-            batch.append({
-                "id": doc_id,
-                "title": title,
-                "content": chunk,
-                "tags": tags,
-                "source_path": blob.name,
-                "chunk_index": i,
-                "content_vector": vector,
-            })
-
-            # Upload in batches of 100 for efficiency
-            if len(batch) >= 100:
-                search_client.upload_documents(batch)
-                logger.info("Indexed batch of %d documents.", len(batch))
-                batch.clear()
-                time.sleep(0.5)  # Brief pause to respect rate limits
+    target = live_index
+    if blue_green:
+        # Resume into the version an interrupted blue/green build left behind
+        unfinished = journal.unfinished_index(mode) if journal and not fresh else None
+        existing = set(index_client.list_index_names())
+        target = unfinished if unfinished in existing else new_version_name(alias)
+        logger.info("Building index version '%s' (live: '%s')", target, live_index)
 
-    if batch:
-        search_client.upload_documents(batch)
-        logger.info("Indexed final batch of %d documents.", len(batch))
+    ensure_index(index_client, target)
+    search_client = SearchClient(settings.azure_search_service_endpoint, target, credential)
+
+    index = index_pipelined if pipelined else index_serial
+    if journal:
+        journal.begin(mode, target, fresh=fresh)
+        if not get_embedding_cache():
+            logger.warning("Embedding cache is disabled: a resumed build re-embeds unfinished notes.")
+
+    try:
+        if incremental:
+            index_incremental(container, search_client, openai_client, index, journal)
+        else:
+            expected = index_full(container, search_client, openai_client, index, journal)
+            if blue_green:
+                publish_version(index_client, search_client, alias, live_index, target, expected)
+        if journal:
+            journal.finish()
+    finally:
+        if journal:
+            journal.close()
+    _log_cache_stats()
+
+
+def publish_version(
+    index_client: SearchIndexClient,
+    search_client: SearchClient,
+    alias: str,
+    live_index: str,
+    target: str,
+    expected: int,
+) -> None:
+    """Validates a freshly built index version, points the alias at it and prunes old versions."""
+    count = wait_for_document_count(
+        search_client, expected, timeout=settings.index_swap_count_timeout_seconds
+    )
+    live_count = None
+    if live_index != target and live_index in set(index_client.list_index_names()):
+        live_count = index_client.get_search_client(live_index).get_document_count()
+    validate_version(count, expected, live_count, settings.index_swap_min_ratio)
+
+    swap_alias(index_client, alias, target)
+    prune_versions(index_client, alias, keep=settings.index_keep_versions)
 
-    logger.info("Indexing complete.")
+
+def _log_cache_stats() -> None:
+    cache = get_embedding_cache()
+    if cache:
+        logger.info(
+            "Embedding cache: %d hits | %d misses | %.1f MB",
+            cache.hits, cache.misses, cache.size_bytes / 1e6,
+        )
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Build the Azure AI Search index from the vault blobs.")
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Run download, chunking, embedding and upload as concurrent stages.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-index new or changed notes and remove chunks of deleted notes.",
+    )
+    mode.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="Build a new index version and switch the alias to it once validated.",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Discard the checkpoint of an unfinished build instead of resuming it.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["azure", "local"],
+        default=settings.retrieval_backend,
+        help="Index into Azure AI Search or into the local vector index (default: RETRIEVAL_BACKEND).",
+    )
+    args = parser.parse_args()
+    run(
+        pipelined=args.pipelined,
+        incremental=args.incremental,
+        fresh=args.fresh,
+        blue_green=args.blue_green,
+        backend=args.backend,
+    )
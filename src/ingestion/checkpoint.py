@@ -0,0 +1,154 @@
+"""
+Checkpoint journal for resumable index builds.
+
+The journal records, per blob, how far indexing got (chunked → embedded → uploaded)
+together with the blob's content hash and chunk ids. When a build dies halfway, the
+next run with the same mode and index resumes: blobs that were fully uploaded with an
+unchanged hash are skipped. Chunks that were embedded but not uploaded are re-embedded
+from the embedding cache, so successful embedding calls are never paid for twice.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CHUNKED = "chunked"
+EMBEDDED = "embedded"
+UPLOADED = "uploaded"
+
+
+class BuildJournal:
+    """Thread-safe SQLite journal of per-blob indexing progress for one build."""
+
+    def __init__(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.skipped = 0
+        self._lock = threading.Lock()
+        # Chunk ids of each in-flight blob that still await embedding / upload
+        self._pending_embed: dict[str, set[str]] = {}
+        self._pending_upload: dict[str, set[str]] = {}
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                name    TEXT PRIMARY KEY,
+                md5     TEXT NOT NULL,
+                status  TEXT NOT NULL,
+                ids     TEXT NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+
+    def begin(self, mode: str, index_name: str, fresh: bool = False) -> bool:
+        """
+        Starts a build. Returns True when an unfinished build with the same mode and
+        index is resumed; otherwise (or with `fresh=True`) the journal is reset.
+        """
+        with self._lock:
+            run = dict(self._conn.execute("SELECT key, value FROM run").fetchall())
+            resumed = (
+                not fresh
+                and run.get("state") == "running"
+                and run.get("mode") == mode
+                and run.get("index") == index_name
+            )
+            self._conn.execute("BEGIN")
+            if not resumed:
+                self._conn.execute("DELETE FROM blobs")
+                self._conn.execute("DELETE FROM run")
+                self._conn.executemany(
+                    "INSERT INTO run VALUES (?, ?)",
+                    [("mode", mode), ("index", index_name), ("started", str(time.time()))],
+                )
+            self._conn.execute("INSERT OR REPLACE INTO run VALUES ('state', 'running')")
+            self._conn.execute("COMMIT")
+
+        if resumed:
+            counts = self.status_counts()
+            logger.info(
+                "Resuming unfinished %s build of '%s': %s",
+                mode, index_name, ", ".join(f"{n} {s}" for s, n in counts.items()) or "no blobs yet",
+            )
+        return resumed
+
+    def unfinished_index(self, mode: str) -> str | None:
+        """Returns the target index of an unfinished build in `mode`, if there is one."""
+        with self._lock:
+            run = dict(self._conn.execute("SELECT key, value FROM run").fetchall())
+        if run.get("state") == "running" and run.get("mode") == mode:
+            return run.get("index")
+        return None
+
+    def is_done(self, name: str, md5: str) -> bool:
+        """True if the blob was fully uploaded by this build and its content is unchanged."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT md5, status FROM blobs WHERE name = ?", (name,)
+            ).fetchone()
+            done = bool(md5) and row is not None and row == (md5, UPLOADED)
+            if done:
+                self.skipped += 1
+            return done
+
+    def uploaded_ids(self) -> set[str]:
+        """Chunk ids of every blob this build has fully uploaded."""
+        with self._lock:
+            rows = self._conn.execute("SELECT ids FROM blobs WHERE status = ?", (UPLOADED,))
+            return {doc_id for (ids,) in rows for doc_id in json.loads(ids)}
+
+    def status_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM blobs GROUP BY status"))
+
+    def record_chunks(self, name: str, md5: str, docs: list[dict]) -> None:
+        """Registers the chunks of a blob; a blob without chunks is done right away."""
+        ids = [doc["id"] for doc in docs]
+        with self._lock:
+            if ids:
+                self._pending_embed[name] = set(ids)
+                self._pending_upload[name] = set(ids)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?)",
+                (name, md5, CHUNKED if ids else UPLOADED, json.dumps(ids), time.time()),
+            )
+
+    def record_embedded(self, docs: list[dict]) -> None:
+        self._advance(docs, self._pending_embed, EMBEDDED)
+
+    def record_uploaded(self, docs: list[dict]) -> None:
+        self._advance(docs, self._pending_upload, UPLOADED)
+
+    def _advance(self, docs: list[dict], pending: dict[str, set[str]], status: str) -> None:
+        with self._lock:
+            completed = []
+            for doc in docs:
+                remaining = pending.get(doc["source_path"])
+                if remaining is None:
+                    continue
+                remaining.discard(doc["id"])
+                if not remaining:
+                    del pending[doc["source_path"]]
+                    completed.append(doc["source_path"])
+            if completed:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE blobs SET status = ?, updated = ? WHERE name = ?",
+                    [(status, now, name) for name in completed],
+                )
+
+    def finish(self) -> None:
+        """Marks the build complete, so the next run starts from scratch."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO run VALUES ('state', 'complete')")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,319 @@
+"""
+Markdown-aware, token-budgeted chunking.
+
+Notes are split into structural blocks (headings, paragraphs, fenced code blocks) and the
+blocks are packed greedily into chunks of at most `max_tokens` tokens, as counted by the
+embedding model's tokenizer. Chunks preferably start at a heading, and every chunk is
+prefixed with the path of the enclosing headings (e.g. "Docker > Networking"), so each
+chunk carries its section context.
+
+The engine works on offsets rather than substrings, so it stays fast on multi-megabyte
+notes (transcripts, web clippings):
+  1. The note is tokenized once; tokens are mapped to their end offsets in the text.
+  2. A single regex scan finds the structural lines and yields block (start, end) spans.
+  3. Token counts for all blocks come from one vectorized `searchsorted` over the offsets.
+  4. Blocks are packed into chunk spans; text is only sliced out for the final chunks.
+"""
+
+import re
+from collections.abc import Callable, Iterable, Iterator
+from functools import lru_cache
+
+import numpy as np
+import tiktoken
+
+EMBEDDING_ENCODING = "cl100k_base"   # Tokenizer of text-embedding-3-small
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_STREAM_WINDOW = 1_000_000   # Characters buffered per note by chunk_markdown_stream
+
+# Only lines that change the block structure: blank lines, headings and code fences
+_STRUCTURE = re.compile(r"^(?:[ \t]*$|(#{1,6})[ \t]+(.*?)[ \t]*#*[ \t]*$|[ \t]*(```|~~~))", re.M)
+_NON_SPACE = re.compile(r"\S")
+_NEWLINE = re.compile(r"\n")
+
+TokenEnds = Callable[[str], np.ndarray]
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> tiktoken.Encoding:
+    return tiktoken.get_encoding(EMBEDDING_ENCODING)
+
+
+@lru_cache(maxsize=1)
+def _token_byte_lengths() -> np.ndarray:
+    """Byte length of every token in the vocabulary (computed once per process)."""
+    encoding = _encoding()
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:  # Unused ids between the regular and special tokens
+            pass
+    return lengths
+
+
+def tiktoken_token_ends(text: str) -> np.ndarray:
+    """Tokenizes `text` once and returns the character offset at which each token ends."""
+    tokens = np.asarray(_encoding().encode_ordinary(text), dtype=np.int64)
+    byte_ends = np.cumsum(_token_byte_lengths()[tokens])
+    # Map byte offsets to character offsets by counting UTF-8 lead bytes before each offset
+    raw = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    chars_before = np.concatenate(([0], np.cumsum((raw & 0xC0) != 0x80)))
+    return chars_before[byte_ends]
+
+
+def count_tokens(text: str) -> int:
+    """Counts tokens with the embedding model's tokenizer."""
+    return len(_encoding().encode_ordinary(text))
+
+
+def scan_blocks(
+    text: str, headings: list[tuple[int, str]] | None = None
+) -> tuple[list[tuple[int, int]], list[tuple[str, ...]], list[bool]]:
+    """
+    Finds the structural blocks of a note in one pass.
+    Returns parallel lists of (start, end) spans, heading paths and is-heading flags.
+
+    `headings` is the (level, title) stack of enclosing headings; pass a list to start
+    from a known section and to receive the stack at the end of `text` (updated in place).
+    """
+    spans: list[tuple[int, int]] = []
+    paths: list[tuple[str, ...]] = []
+    is_heading: list[bool] = []
+    headings = [] if headings is None else headings
+    path: tuple[str, ...] = tuple(title for _, title in headings)
+    block_start = 0
+    fence: str | None = None
+
+    def close(end: int) -> None:
+        if _NON_SPACE.search(text, block_start, end):
+            spans.append((block_start, end))
+            paths.append(path)
+            is_heading.append(False)
+
+    for match in _STRUCTURE.finditer(text):
+        line_start, line_end = match.start(), match.end()
+        fence_token = match.group(3)
+
+        if fence is not None:
+            if fence_token == fence:
+                fence = None
+                close(line_end)
+                block_start = line_end
+            continue
+        if fence_token:
+            close(line_start)
+            block_start = line_start
+            fence = fence_token
+        elif match.group(1):
+            close(line_start)
+            level = len(match.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, match.group(2)))
+            path = tuple(title for _, title in headings)
+            spans.append((line_start, line_end))
+            paths.append(path)
+            is_heading.append(True)
+            block_start = line_end
+        else:  # Blank line
+            close(line_start)
+            block_start = line_end
+
+    close(len(text))  # Also closes an unterminated code fence
+    return spans, paths, is_heading
+
+
+class _Tokens:
+    """Token end offsets of one note; counts tokens per span by binary search."""
+
+    def __init__(self, ends: np.ndarray):
+        self.ends = np.asarray(ends)
+
+    def count(self, starts, stops) -> np.ndarray:
+        # Tokens whose end offset falls inside (start, stop]
+        return np.searchsorted(self.ends, stops, "right") - np.searchsorted(self.ends, starts, "right")
+
+    def cut_points(self, start: int, stop: int, max_tokens: int) -> list[int]:
+        """Offsets that split [start, stop) into runs of at most `max_tokens` tokens."""
+        first, last = np.searchsorted(self.ends, [start, stop], "right")
+        return [int(self.ends[i]) for i in range(first + max_tokens - 1, last - 1, max_tokens)]
+
+
+def _split_span(
+    text: str, start: int, stop: int, tokens: _Tokens, max_tokens: int, first_budget: int
+) -> list[tuple[int, int, int]]:
+    """
+    Splits an oversized block on line boundaries, then on token boundaries. The first
+    piece is limited to `first_budget` tokens so it can fill up the currently open chunk.
+    """
+    cuts = [start, *(m.end() for m in _NEWLINE.finditer(text, start, stop - 1)), stop]
+    line_tokens = tokens.count(cuts[:-1], cuts[1:]).tolist()
+
+    pieces: list[tuple[int, int, int]] = []
+    piece_start, used = start, 0
+    for line_start, line_stop, n in zip(cuts, cuts[1:], line_tokens):
+        budget = max_tokens if pieces else first_budget
+        if used + n <= budget:
+            used += n
+            continue
+        if used:
+            pieces.append((piece_start, line_start, used))
+            piece_start, used = line_start, 0
+            budget = max_tokens
+        if n <= budget:
+            used = n
+            continue
+        # A single line longer than the budget: cut it at token boundaries
+        points = [line_start, *tokens.cut_points(line_start, line_stop, budget), line_stop]
+        counts = tokens.count(points[:-1], points[1:]).tolist()
+        pieces += [(a, b, c) for a, b, c in zip(points, points[1:-1], counts) if b > a]
+        # The tail of the line stays open so following lines can join it
+        piece_start, used = points[-2], counts[-1]
+    if used:
+        pieces.append((piece_start, stop, used))
+    return [p for p in pieces if _NON_SPACE.search(text, p[0], p[1])]
+
+
+def _breadcrumb(path: tuple[str, ...]) -> str:
+    return " > ".join(path)
+
+
+def chunk_spans(
+    text: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    token_ends: TokenEnds | None = None,
+    headings: list[tuple[int, str]] | None = None,
+) -> list[tuple[tuple[str, ...], int, int]]:
+    """
+    Computes chunk boundaries without copying text.
+    Returns (heading path to prefix, start offset, end offset) per chunk.
+    """
+    token_ends = token_ends or tiktoken_token_ends
+    tokens = _Tokens(token_ends(text))
+    spans, paths, is_heading = scan_blocks(text, headings)
+    if not spans:
+        return []
+
+    bounds = np.asarray(spans)
+    block_tokens = tokens.count(bounds[:, 0], bounds[:, 1]).tolist()
+    crumb_costs: dict[tuple[str, ...], int] = {(): 0}
+
+    def crumb_cost(path: tuple[str, ...]) -> int:
+        if path not in crumb_costs:
+            crumb_costs[path] = len(token_ends(_breadcrumb(path))) + 1  # +1 for the separator
+        return crumb_costs[path]
+
+    chunks: list[tuple[tuple[str, ...], int, int]] = []
+    # State of the open chunk; start < 0 means no chunk is open
+    prefix: tuple[str, ...] = ()
+    chunk_start, chunk_end, used = -1, -1, 0
+    # Trailing heading of the open chunk: (start, tokens, heading path)
+    last_heading: tuple[int, int, tuple[str, ...]] | None = None
+
+    def close_chunk(end: int) -> None:
+        nonlocal chunk_start
+        chunks.append((prefix, chunk_start, end))
+        chunk_start = -1
+
+    def open_chunk(context: tuple[str, ...], start: int, body_tokens: int) -> None:
+        nonlocal prefix, chunk_start, used
+        cost = crumb_cost(context)
+        # Only add the heading path when it still fits next to the body
+        prefix = context if context and cost + body_tokens <= max_tokens else ()
+        chunk_start, used = start, (cost if prefix else 0)
+
+    for (start, stop), path, heading, n in zip(spans, paths, is_heading, block_tokens):
+        # Start a new chunk at a heading once the current one is reasonably full
+        if heading and chunk_start >= 0 and used >= max_tokens // 2:
+            close_chunk(chunk_end)
+
+        if n <= max_tokens:
+            pieces = [(start, stop, n)]
+        else:
+            # Let the first piece top up the open chunk (e.g. right after its heading)
+            room = max_tokens - used - 1 if chunk_start >= 0 else max_tokens
+            first_budget = room if room >= max_tokens // 4 else max_tokens
+            pieces = _split_span(text, start, stop, tokens, max_tokens, first_budget)
+
+        for piece_start, piece_stop, piece_tokens in pieces:
+            if chunk_start >= 0 and used + 1 + piece_tokens > max_tokens:
+                # Never leave a heading dangling at the end of a chunk: move it along
+                carried = last_heading
+                if (
+                    carried
+                    and carried[0] > chunk_start
+                    and carried[1] + 1 + piece_tokens <= max_tokens
+                ):
+                    close_chunk(carried[0])
+                    open_chunk(carried[2][:-1], carried[0], carried[1] + 1 + piece_tokens)
+                    used += carried[1]
+                else:
+                    close_chunk(chunk_end)
+
+            if chunk_start < 0:
+                open_chunk(path[:-1] if heading else path, piece_start, piece_tokens)
+                used += piece_tokens
+            else:
+                used += 1 + piece_tokens
+            chunk_end = piece_stop
+            last_heading = (piece_start, piece_tokens, path) if heading else None
+
+    if chunk_start >= 0:
+        close_chunk(chunk_end)
+    return chunks
+
+
+def chunk_markdown(
+    text: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    token_ends: TokenEnds | None = None,
+    headings: list[tuple[int, str]] | None = None,
+) -> list[str]:
+    """
+    Splits a Markdown note into chunks of at most `max_tokens` tokens along heading,
+    paragraph and code-block boundaries.
+    """
+    chunks = []
+    for path, start, stop in chunk_spans(text, max_tokens, token_ends, headings):
+        body = text[start:stop].strip()
+        chunks.append(f"{_breadcrumb(path)}\n\n{body}" if path else body)
+    return chunks
+
+
+def chunk_markdown_stream(
+    pieces: Iterable[str],
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    token_ends: TokenEnds | None = None,
+    window: int = DEFAULT_STREAM_WINDOW,
+) -> Iterator[str]:
+    """
+    Chunks a note that arrives as a stream of text pieces (e.g. from an incremental UTF-8
+    decoder), holding at most about `window` characters in memory. Whenever the buffer is
+    full, everything before the start of its last block is chunked and emitted; the heading
+    path carries over to the rest of the note.
+    """
+    headings: list[tuple[int, str]] = []
+    parts: list[str] = []
+    buffered = 0
+
+    for piece in pieces:
+        parts.append(piece)
+        buffered += len(piece)
+        if buffered < window:
+            continue
+
+        buffer = "".join(parts)
+        spans, _, _ = scan_blocks(buffer, list(headings))
+        cut = spans[-1][0] if spans else 0   # The last block may continue in the next piece
+        if cut <= 0:
+            # One block fills the whole window (e.g. a transcript without blank lines):
+            # fall back to the last line break, or to the whole buffer for a single line
+            cut = buffer.rfind("\n") + 1 or len(buffer)
+        yield from chunk_markdown(buffer[:cut], max_tokens, token_ends, headings)
+        buffer = buffer[cut:]
+        parts, buffered = [buffer], len(buffer)
+
+    buffer = "".join(parts)
+    if buffer:
+        yield from chunk_markdown(buffer, max_tokens, token_ends, headings)
@@ -0,0 +1,141 @@
+"""
+Paged enumeration and batched, concurrent deletion of index documents.
+
+A plain `search("*")` stops after the service's result cap, so ids are enumerated with
+keyset paging instead: pages of `page_size` documents ordered by id, each page starting
+after the last id of the previous one. Indexes whose `id` field is not sortable fall
+back to `skip` paging, which Azure AI Search limits to the first 100,000 documents.
+"""
+
+import logging
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from azure.core.exceptions import HttpResponseError
+from azure.search.documents import SearchClient
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000          # Documents per search request (service maximum for `top`)
+MAX_SKIP = 100_000        # Service limit for `skip`
+MAX_BATCH_SIZE = 1000     # Service limit for actions per indexing request
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def source_filter(paths: Iterable[str]) -> str:
+    """OData filter matching documents of any of the given source paths."""
+    joined = "|".join(paths).replace("'", "''")
+    return f"search.in(source_path, '{joined}', '|')"
+
+
+def _and(*filters: str | None) -> str | None:
+    parts = [f"({f})" for f in filters if f]
+    return " and ".join(parts) or None
+
+
+def iter_documents(
+    search_client: SearchClient,
+    select: list[str],
+    filter: str | None = None,
+    page_size: int = PAGE_SIZE,
+) -> Iterator[dict]:
+    """Yields every document matching `filter` (all documents by default), page by page."""
+    select = list(dict.fromkeys(["id", *select]))
+    last_id = None
+    while True:
+        try:
+            page = list(search_client.search(
+                "*",
+                select=select,
+                filter=_and(filter, f"id gt {_quote(last_id)}" if last_id else None),
+                order_by=["id asc"],
+                top=page_size,
+            ))
+        except HttpResponseError as exc:
+            if last_id is not None:
+                raise
+            logger.warning("Keyset paging unavailable (%s); falling back to skip paging.", exc.message)
+            yield from _iter_documents_skip(search_client, select, filter, page_size)
+            return
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["id"]
+
+
+def _iter_documents_skip(
+    search_client: SearchClient, select: list[str], filter: str | None, page_size: int
+) -> Iterator[dict]:
+    skip = 0
+    while True:
+        if skip >= MAX_SKIP:
+            logger.warning("Stopped after %d documents: the service does not skip further.", skip)
+            return
+        page = list(search_client.search("*", select=select, filter=filter, top=page_size, skip=skip))
+        yield from page
+        if len(page) < page_size:
+            return
+        skip += len(page)
+
+
+def iter_ids(search_client: SearchClient, filter: str | None = None) -> Iterator[str]:
+    """Yields the id of every document matching `filter`."""
+    for doc in iter_documents(search_client, ["id"], filter):
+        yield doc["id"]
+
+
+def delete_ids(
+    search_client: SearchClient,
+    ids: Iterable[str],
+    batch_size: int = MAX_BATCH_SIZE,
+    workers: int = 4,
+) -> int:
+    """
+    Deletes documents by id in batches of at most `batch_size`, `workers` batches at a
+    time. Returns the number of deleted documents.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+
+    def batches() -> Iterator[list[dict]]:
+        iterator = iter(ids)
+        while batch := [{"id": doc_id} for doc_id in islice(iterator, batch_size)]:
+            yield batch
+
+    def delete(batch: list[dict]) -> int:
+        search_client.delete_documents(batch)
+        return len(batch)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        deleted = sum(pool.map(delete, batches()))
+    if deleted:
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Deleted %d documents in %.1f s (%.0f docs/s).",
+            deleted, elapsed, deleted / max(elapsed, 1e-9),
+        )
+    return deleted
+
+
+def delete_sources(
+    search_client: SearchClient,
+    paths: Iterable[str],
+    batch_size: int = MAX_BATCH_SIZE,
+    workers: int = 4,
+) -> int:
+    """Deletes every chunk of the given source paths. Returns the number of deleted documents."""
+    paths = list(paths)
+    # Keep each filter expression well below the service's size limit. The ids are
+    # collected before deleting: with skip paging, deleting while paging shifts the
+    # result set and later pages would skip documents that were never deleted
+    ids = [
+        doc_id
+        for start in range(0, len(paths), 100)
+        for doc_id in iter_ids(search_client, source_filter(paths[start:start + 100]))
+    ]
+    return delete_ids(search_client, ids, batch_size, workers)
@@ -0,0 +1,155 @@
+"""
+Persistent, content-addressed embedding cache backed by SQLite.
+
+Vectors are keyed by (embedding model and dimensions, SHA-256 of the chunk text) and
+stored as packed float32 blobs, so re-running the indexer only pays Azure OpenAI for text it has never
+embedded before. When the stored vectors exceed `max_bytes`, the least recently used
+entries are evicted.
+"""
+
+import hashlib
+import logging
+import math
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_EVICT_TARGET = 0.9  # After eviction the cache is at most this fraction of max_bytes
+
+
+def text_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest of a chunk text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def model_key(model: str, dimensions: int) -> str:
+    """Cache key of an embedding model at a vector size, e.g. `text-embedding-3-small:512d`."""
+    return f"{model}:{dimensions}d"
+
+
+def shorten(vector: list[float], dimensions: int) -> list[float]:
+    """
+    Keeps the first `dimensions` values of an embedding and rescales them to unit length,
+    which is how text-embedding-3 models produce shortened vectors.
+    """
+    head = vector[:dimensions]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+class EmbeddingCache:
+    """Thread-safe SQLite store of embedding vectors with size-based LRU eviction."""
+
+    def __init__(self, path: str | Path, max_bytes: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model     TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector    BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Looks up vectors for `texts`; missing entries are returned as None."""
+        hashes = [text_hash(t) for t in texts]
+        found: dict[str, bytes] = {}
+        with self._lock:
+            # Stay well below SQLite's host-parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+
+        return [_decode(found[h]) if h in found else None for h in hashes]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        """Stores vectors for `texts` and evicts old entries if the cache grew too large."""
+        now = time.time()
+        rows = [(model, text_hash(t), _encode(v), now) for t, v in zip(texts, vectors, strict=True)]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for row in rows:
+                previous = self._conn.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND text_hash = ?",
+                    row[:2],
+                ).fetchone()
+                self._conn.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", row)
+                self._size += len(row[2]) - (previous[0] if previous else 0)
+            self._conn.execute("COMMIT")
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        target = int(self.max_bytes * _EVICT_TARGET)
+        evicted = 0
+        cursor = self._conn.execute(
+            "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        )
+        victims = []
+        for model, digest, length in cursor:
+            if self._size <= target:
+                break
+            victims.append((model, digest))
+            self._size -= length
+            evicted += 1
+        cursor.close()
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+        logger.info("Embedding cache: evicted %d entries (now %.1f MB)", evicted, self._size / 1e6)
+
+    def sample(self, model: str, limit: int) -> list[list[float]]:
+        """Returns up to `limit` cached vectors of a model (for offline comparisons)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE model = ? LIMIT ?", (model, limit)
+            ).fetchall()
+        return [_decode(row[0]) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _encode(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
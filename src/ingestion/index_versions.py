@@ -0,0 +1,92 @@
+"""
+Versioned indexes behind an Azure AI Search alias (blue/green rebuilds).
+
+A blue/green build writes into a fresh index named `<alias>-v<UTC timestamp>`. Once its
+document count checks out, the alias, which is the name the API queries, is repointed
+to it in a single call, and versions beyond the most recent few are deleted.
+"""
+
+import logging
+import re
+import time
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from azure.search.documents.indexes.models import SearchAlias
+
+logger = logging.getLogger(__name__)
+
+_COUNT_POLL_INTERVAL = 2.0  # Seconds between document count checks
+
+
+def new_version_name(alias: str) -> str:
+    """Returns the name for a new index version behind `alias`."""
+    return f"{alias}-v{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def list_versions(index_client: SearchIndexClient, alias: str) -> list[str]:
+    """Returns the index versions behind `alias`, oldest first."""
+    pattern = re.compile(re.escape(alias) + r"-v\d{14}")
+    return sorted(name for name in index_client.list_index_names() if pattern.fullmatch(name))
+
+
+def resolve_index_name(index_client: SearchIndexClient, name: str) -> str:
+    """Returns the index an alias points to, or `name` itself when it is not an alias."""
+    try:
+        return index_client.get_alias(name).indexes[0]
+    except ResourceNotFoundError:
+        return name
+
+
+def wait_for_document_count(search_client: SearchClient, expected: int, timeout: float) -> int:
+    """
+    Polls the document count until it reaches `expected` or `timeout` seconds pass.
+    Counts lag behind uploads by a few seconds. Returns the last observed count.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        count = search_client.get_document_count()
+        if count >= expected or time.monotonic() >= deadline:
+            return count
+        time.sleep(_COUNT_POLL_INTERVAL)
+
+
+def validate_version(count: int, expected: int, live_count: int | None, min_ratio: float) -> None:
+    """
+    Raises RuntimeError unless a new version holds exactly the documents that were
+    indexed, and at least `min_ratio` times the documents of the live index.
+    """
+    if count != expected:
+        raise RuntimeError(f"New index holds {count} documents, expected {expected}")
+    if expected == 0:
+        raise RuntimeError("New index is empty")
+    if live_count and count < live_count * min_ratio:
+        raise RuntimeError(
+            f"New index holds {count} documents, fewer than {min_ratio:.0%} of the "
+            f"{live_count} in the live index"
+        )
+
+
+def swap_alias(index_client: SearchIndexClient, alias: str, index_name: str) -> None:
+    """Points `alias` at `index_name` in one call, so queries move over atomically."""
+    if alias in set(index_client.list_index_names()):
+        # One-time migration: an alias cannot share its name with a concrete index
+        logger.warning("Deleting concrete index '%s' to replace it with an alias.", alias)
+        index_client.delete_index(alias)
+    index_client.create_or_update_alias(SearchAlias(name=alias, indexes=[index_name]))
+    logger.info("Alias '%s' now points to '%s'.", alias, index_name)
+
+
+def prune_versions(index_client: SearchIndexClient, alias: str, keep: int) -> list[str]:
+    """
+    Deletes all but the `keep` most recent versions behind `alias`, never the one the
+    alias currently points to. Returns the deleted index names.
+    """
+    live = resolve_index_name(index_client, alias)
+    versions = list_versions(index_client, alias)
+    stale = [name for name in versions[:len(versions) - max(keep, 1)] if name != live]
+    for name in stale:
+        index_client.delete_index(name)
+        logger.info("Deleted old index version '%s'.", name)
+    return stale
@@ -0,0 +1,175 @@
+"""
+Minimal threaded pipeline: stages connected by bounded queues.
+
+Each stage runs in its own pool of worker threads. A full downstream queue blocks
+the upstream workers (back-pressure), so the number of in-flight items per stage
+is bounded by `workers` plus the queue size. The first exception raised by any
+stage aborts the whole pipeline and is re-raised by `run_pipeline`.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()          # End-of-stream marker passed between stages
+_POLL_INTERVAL = 0.1      # Seconds between abort checks while blocked on a queue
+
+
+class _Aborted(Exception):
+    """Raised inside workers when another stage has failed."""
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline step.
+
+    - `func(item)` returns an iterable of zero or more outputs per input item.
+    - With `stream=True`, `func` instead receives the whole input iterator and returns
+      an output iterator; useful for stateful steps such as re-batching. Stream
+      stages always run on a single worker.
+    """
+
+    name: str
+    func: Callable[[Any], Iterable[Any]]
+    workers: int = 1
+    stream: bool = False
+
+
+class _Pipeline:
+    def __init__(self, stages: list[Stage], queue_size: int):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.abort = threading.Event()
+        self.errors: list[BaseException] = []
+        self.processed = [0] * len(stages)
+        self.lock = threading.Lock()
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        while not self.abort.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        raise _Aborted
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self.abort.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        raise _Aborted
+
+    def _iter(self, q: queue.Queue) -> Iterator[Any]:
+        while True:
+            item = self._get(q)
+            if item is _DONE:
+                self._put(q, _DONE)  # Let sibling workers see the marker too
+                return
+            yield item
+
+    def _fail(self, exc: BaseException) -> None:
+        with self.lock:
+            self.errors.append(exc)
+        self.abort.set()
+
+    def _feed(self, source: Iterable[Any]) -> None:
+        try:
+            for item in source:
+                self._put(self.queues[0], item)
+            self._put(self.queues[0], _DONE)
+        except _Aborted:
+            pass
+        except BaseException as exc:
+            self._fail(exc)
+
+    def _work(self, index: int, remaining: list[int]) -> None:
+        stage = self.stages[index]
+        inbox, outbox = self.queues[index], self.queues[index + 1]
+        try:
+            if stage.stream:
+                for out in stage.func(self._iter(inbox)):
+                    self._put(outbox, out)
+            else:
+                for item in self._iter(inbox):
+                    for out in stage.func(item):
+                        self._put(outbox, out)
+                    with self.lock:
+                        self.processed[index] += 1
+        except _Aborted:
+            return
+        except BaseException as exc:
+            logger.error("Pipeline stage '%s' failed: %s", stage.name, exc)
+            self._fail(exc)
+            return
+
+        with self.lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            try:
+                self._put(outbox, _DONE)
+            except _Aborted:
+                pass
+
+    def run(self, source: Iterable[Any]) -> list[Any]:
+        threads = [
+            threading.Thread(target=self._feed, args=(source,), name="pipeline-source", daemon=True)
+        ]
+        for index, stage in enumerate(self.stages):
+            workers = 1 if stage.stream else max(1, stage.workers)
+            remaining = [workers]
+            threads += [
+                threading.Thread(
+                    target=self._work,
+                    args=(index, remaining),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True,
+                )
+                for n in range(workers)
+            ]
+
+        for thread in threads:
+            thread.start()
+
+        results: list[Any] = []
+        try:
+            results.extend(self._iter(self.queues[-1]))
+        except _Aborted:
+            pass
+        finally:
+            self.abort.set()  # Unblocks any worker still waiting on a queue
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+        return results
+
+
+def run_pipeline(source: Iterable[Any], stages: list[Stage], queue_size: int = 64) -> list[Any]:
+    """
+    Pushes every item of `source` through `stages` and returns the outputs of the last stage.
+    Each stage's input queue holds at most `queue_size` items.
+    """
+    if not stages:
+        return list(source)
+
+    pipeline = _Pipeline(stages, queue_size)
+    start = time.perf_counter()
+    results = pipeline.run(source)
+    elapsed = time.perf_counter() - start
+
+    for stage, count in zip(stages, pipeline.processed):
+        if not stage.stream:
+            rate = count / max(elapsed, 1e-9)
+            logger.info("Stage '%s': %d items (%.1f items/s)", stage.name, count, rate)
+    return results
@@ -2,32 +2,49 @@
 Phase 1 – Data Pipeline: Upload Obsidian Vault to Azure Blob Storage.
 
 Usage:
-    python -m src.ingestion.upload_vault
+    python -m src.ingestion.upload_vault [--sync]
 
 What this script does:
   1. Recursively scans the local Obsidian vault for all .md files.
   2. Parses YAML frontmatter and extracts tags/metadata.
   3. Uploads each file including metadata properties to Azure Blob Storage.
+     With --sync, unchanged notes (same MD5 of content, title and tags) are skipped
+     and blobs whose source file was deleted are removed.
 """
 
+import argparse
 import hashlib
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import frontmatter
-from azure.storage.blob import BlobServiceClient, ContentSettings
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient, ContainerClient, ContentSettings
 
 from src.config import settings
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
+DELETE_BATCH_SIZE = 256  # Max sub-requests per Blob batch call
+
 
 def compute_md5(content: str) -> str:
     """Returns an MD5 hash of the text (for deduplication)."""
     return hashlib.md5(content.encode("utf-8")).hexdigest()
 
 
+def note_hash(content: str, title: str, tags: list[str]) -> str:
+    """
+    MD5 over everything that ends up in the blob and its metadata, so a note whose
+    tags alone changed is still re-uploaded (and re-indexed).
+    """
+    return compute_md5(json.dumps({"title": title, "tags": tags, "content": content}, ensure_ascii=False))
+
+
 def parse_note(path: Path) -> dict:
     """
     Loads a Markdown file and extracts:
@@ -51,7 +68,7 @@ def parse_note(path: Path) -> dict:
         "tags": tags,
         "content": post.content,
         "raw_metadata": str(post.metadata),
-        "md5": compute_md5(post.content),
+        "md5": note_hash(post.content, path.stem, tags),
     }
 
 
@@ -60,9 +77,32 @@ def _ascii_safe(value: str) -> str:
     return value.encode("ascii", errors="ignore").decode("ascii")
 
 
+def blob_name_for(relative_path: str) -> str:
+    """Maps a vault-relative path to its blob name (always forward slashes)."""
+    return relative_path.replace("\\", "/")
+
+
+def list_remote_hashes(container_client: ContainerClient) -> dict[str, str]:
+    """Lists the container once and returns {blob name: md5 metadata} for every note."""
+    return {
+        blob.name: (blob.metadata or {}).get("md5", "")
+        for blob in container_client.list_blobs(include=["metadata"])
+        if blob.name.endswith(".md")
+    }
+
+
+def delete_blobs(container_client: ContainerClient, names: list[str]) -> None:
+    """Deletes blobs in batched requests."""
+    for start in range(0, len(names), DELETE_BATCH_SIZE):
+        batch = names[start:start + DELETE_BATCH_SIZE]
+        container_client.delete_blobs(*batch)
+        for name in batch:
+            logger.info("Deleted: %s", name)
+
+
 def upload_note(client: BlobServiceClient, note: dict) -> None:
     """Uploads a single Obsidian note as a blob with metadata."""
-    blob_name = note["relative_path"].replace("\\", "/")
+    blob_name = blob_name_for(note["relative_path"])
     blob_client = client.get_blob_client(
         container=settings.azure_storage_container_name,
         blob=blob_name,
@@ -81,7 +121,38 @@ def upload_note(client: BlobServiceClient, note: dict) -> None:
     logger.info("Uploaded: %s", blob_name)
 
 
-def run() -> None:
+def create_service_client(workers: int) -> BlobServiceClient:
+    """
+    Creates one BlobServiceClient whose HTTP connection pool is sized for `workers`
+    concurrent uploads. All blob clients derived from it share this transport.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return BlobServiceClient.from_connection_string(
+        settings.azure_storage_connection_string,
+        transport=RequestsTransport(session=session, session_owner=False),
+    )
+
+
+def sync_note(client: BlobServiceClient, path: Path, remote: dict[str, str], sync: bool) -> str:
+    """
+    Parses and uploads one note. Returns "uploaded", "unchanged" (sync mode, same MD5)
+    or "failed"; errors are logged rather than raised so one bad file never aborts the run.
+    """
+    try:
+        note = parse_note(path)
+        if sync and remote.get(blob_name_for(note["relative_path"])) == note["md5"]:
+            return "unchanged"
+        upload_note(client, note)
+        return "uploaded"
+    except Exception as exc:
+        logger.error("Failed for %s: %s", path, exc)
+        return "failed"
+
+
+def run(sync: bool = False, workers: int | None = None) -> None:
     vault = Path(settings.obsidian_vault_path)
     if not vault.exists():
         raise FileNotFoundError(f"Vault directory not found: {vault}")
@@ -89,9 +160,8 @@ def run() -> None:
     md_files = list(vault.rglob("*.md"))
     logger.info("Found %d .md files", len(md_files))
 
-    service_client = BlobServiceClient.from_connection_string(
-        settings.azure_storage_connection_string
-    )
+    workers = workers or settings.upload_workers
+    service_client = create_service_client(workers)
 
     # Create container if it does not exist yet
     container_client = service_client.get_container_client(
@@ -101,18 +171,38 @@ def run() -> None:
         container_client.create_container()
         logger.info("Container created: %s", settings.azure_storage_container_name)
 
-    success, failed = 0, 0
-    for path in md_files:
-        try:
-            note = parse_note(path)
-            upload_note(service_client, note)
-            success += 1
-        except Exception as exc:
-            logger.error("Failed for %s: %s", path, exc)
-            failed += 1
+    # In sync mode a single list call tells us what is already up to date
+    remote = list_remote_hashes(container_client) if sync else {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(lambda path: sync_note(service_client, path, remote, sync), md_files))
+    success, failed, skipped = (statuses.count(s) for s in ("uploaded", "failed", "unchanged"))
+    local_names = {blob_name_for(str(path.relative_to(vault))) for path in md_files}
+
+    deleted = 0
+    if sync:
+        orphans = sorted(set(remote) - local_names)
+        delete_blobs(container_client, orphans)
+        deleted = len(orphans)
 
-    logger.info("Done. Succeeded: %d | Failed: %d", success, failed)
+    logger.info(
+        "Done. Succeeded: %d | Failed: %d | Unchanged: %d | Deleted: %d",
+        success, failed, skipped, deleted,
+    )
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Upload the Obsidian vault to Azure Blob Storage.")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Skip unchanged notes (MD5 match) and delete blobs whose note was removed locally.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parallel uploads (default: UPLOAD_WORKERS setting).",
+    )
+    args = parser.parse_args()
+    run(sync=args.sync, workers=args.workers)
@@ -0,0 +1,266 @@
+"""
+Client-side rate limiting for Azure OpenAI deployments.
+
+`RateLimiter` combines two token buckets (requests and tokens per minute, matching the
+RPM/TPM quota of a deployment) with an AIMD concurrency limit: every successful call
+raises the number of requests allowed in flight a little, every 429 halves it and
+pauses all callers for the server's `Retry-After`. Throttled calls are retried.
+`call_raw` / `acall_raw` take `with_raw_response` methods and align the buckets with the
+`x-ratelimit-remaining-*` headers of every response, so usage by other clients of the
+same deployment is accounted for before it causes a 429.
+
+One limiter per deployment is shared by the indexer and the query path; see
+`embedding_limiter()`.
+"""
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from src.config import get_settings
+
+if TYPE_CHECKING:
+    from openai import RateLimitError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_BURST_SECONDS = 10       # Azure OpenAI evaluates quotas over short windows; cap bursts to 10 s
+_SLOT_POLL = 0.05         # Seconds between checks while all concurrency slots are taken
+_MAX_BACKOFF = 60.0       # Upper bound for waits without a Retry-After header
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for quota accounting."""
+    return len(text) // 4 + 1
+
+
+class _Bucket:
+    """Token bucket refilled at `per_minute / 60` per second. 0 disables the bucket."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * _BURST_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (requests larger than the burst may overdraw)."""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate:
+            self.level -= amount
+
+    def cap(self, remaining: float) -> None:
+        """Lowers the level to what the server reports as remaining."""
+        if self.rate:
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Thread- and asyncio-safe RPM/TPM limiter with AIMD concurrency and 429 retries."""
+
+    def __init__(
+        self,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int,
+        max_retries: int = 6,
+        name: str = "rate limiter",
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.concurrency = float(self.max_concurrency)
+        self.throttled = 0
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Takes a slot and quota and returns 0, or returns the seconds to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._resume_at:
+                return self._resume_at - now
+            if self._in_flight >= int(self.concurrency):
+                return _SLOT_POLL
+            wait = max(self._requests.wait(1, now), self._tokens.wait(tokens, now))
+            if wait > 0:
+                return wait
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._in_flight += 1
+            return 0.0
+
+    def acquire(self, tokens: int = 1) -> None:
+        while (wait := self._try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 1) -> None:
+        while (wait := self._try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def release(
+        self, throttled: bool = False, retry_after: float | None = None, failed: bool = False
+    ) -> None:
+        """
+        Frees a slot. A success grows the concurrency limit additively, a 429 halves it;
+        other failures leave it unchanged.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                return
+            if not throttled:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                return
+            self.throttled += 1
+            self.concurrency = max(1.0, self.concurrency / 2)
+            if retry_after:
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+        logger.warning(
+            "%s: throttled (429), pausing %.1f s, concurrency now %d",
+            self.name, retry_after or 0, int(self.concurrency),
+        )
+
+    def observe_headers(self, headers) -> None:
+        """Aligns the buckets with the `x-ratelimit-remaining-*` headers of a response."""
+        with self._lock:
+            for header, bucket in [
+                ("x-ratelimit-remaining-requests", self._requests),
+                ("x-ratelimit-remaining-tokens", self._tokens),
+            ]:
+                value = headers.get(header)
+                if value is not None:
+                    try:
+                        bucket.cap(float(value))
+                    except ValueError:
+                        pass
+
+    def _on_throttle(self, exc: "RateLimitError", attempt: int) -> float:
+        headers = exc.response.headers
+        self.observe_headers(headers)
+        retry_after = retry_after_seconds(headers)
+        if retry_after is None:
+            retry_after = min(_MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.0)
+        self.release(throttled=True, retry_after=retry_after)
+        return retry_after
+
+    def call(self, func: Callable[..., T], *args: Any, tokens: int = 1, **kwargs: Any) -> T:
+        """Calls `func` within the quota, retrying when Azure OpenAI answers 429."""
+        from openai import RateLimitError
+
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                result = func(*args, **kwargs)
+            except RateLimitError as exc:
+                self._on_throttle(exc, attempt)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except BaseException:
+                self.release(failed=True)
+                raise
+            self.release()
+            return result
+        raise AssertionError("unreachable")
+
+    async def acall(
+        self, func: Callable[..., Awaitable[T]], *args: Any, tokens: int = 1, **kwargs: Any
+    ) -> T:
+        """Async variant of `call`."""
+        from openai import RateLimitError
+
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(tokens)
+            try:
+                result = await func(*args, **kwargs)
+            except RateLimitError as exc:
+                self._on_throttle(exc, attempt)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except BaseException:
+                self.release(failed=True)
+                raise
+            self.release()
+            return result
+        raise AssertionError("unreachable")
+
+    def _parsed(self, response: Any) -> Any:
+        self.observe_headers(response.headers)
+        return response.parse()
+
+    def call_raw(self, func: Callable[..., Any], *args: Any, tokens: int = 1, **kwargs: Any) -> Any:
+        """
+        `call` for a `with_raw_response` method (e.g. `client.embeddings.with_raw_response.create`):
+        reads the rate-limit headers of the response and returns its parsed body.
+        """
+        return self._parsed(self.call(func, *args, tokens=tokens, **kwargs))
+
+    async def acall_raw(
+        self, func: Callable[..., Awaitable[Any]], *args: Any, tokens: int = 1, **kwargs: Any
+    ) -> Any:
+        """Async variant of `call_raw`."""
+        return self._parsed(await self.acall(func, *args, tokens=tokens, **kwargs))
+
+
+def retry_after_seconds(headers) -> float | None:
+    """Parses `retry-after-ms` or `Retry-After` (seconds or HTTP date) from response headers."""
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+_embedding_limiter: RateLimiter | None = None
+_embedding_limiter_lock = threading.Lock()
+
+
+def embedding_limiter() -> RateLimiter:
+    """Returns the process-wide limiter for the embedding deployment."""
+    global _embedding_limiter
+    with _embedding_limiter_lock:
+        if _embedding_limiter is None:
+            settings = get_settings()
+            _embedding_limiter = RateLimiter(
+                rpm=settings.embedding_rpm_quota,
+                tpm=settings.embedding_tpm_quota,
+                max_concurrency=settings.embedding_max_concurrency,
+                max_retries=settings.rate_limit_max_retries,
+                name="embeddings",
+            )
+        return _embedding_limiter
@@ -0,0 +1,158 @@
+"""In-process caches for the retrieval hot path."""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds and collapses whitespace so trivially different questions share a cache key."""
+    return " ".join(query.casefold().split())
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+
+    Holds at most `max_entries` items; the least recently used entry is dropped first.
+    Entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by query *meaning* rather than query text.
+
+    Each entry stores the normalized query vector, the answer and the version (content
+    hash) of every source note it was built from. A lookup returns the cached answer of
+    the most similar entry when its cosine similarity reaches `threshold`. Entries expire
+    after `ttl` seconds, and are dropped as soon as a later search reports a different
+    version of one of their sources (i.e. the note was re-indexed with new content).
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries: list[dict] = []
+        self._matrix: "np.ndarray | None" = None   # Stacked unit vectors, one row per entry
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: list[float]) -> "np.ndarray":
+        import numpy as np  # Deferred: keeps importing the API fast
+
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _rebuild(self) -> None:
+        import numpy as np
+
+        self._matrix = np.stack([e["vector"] for e in self._entries]) if self._entries else None
+
+    def _expire(self, now: float) -> None:
+        alive = [e for e in self._entries if now - e["created"] <= self.ttl]
+        if len(alive) != len(self._entries):
+            self._entries = alive
+            self._rebuild()
+
+    def lookup(self, vector: list[float], top_k: int) -> dict | None:
+        """Returns the cached answer for a sufficiently similar query, or None."""
+        with self._lock:
+            self._expire(time.monotonic())
+            # Entries embedded at another size (the live index changed it) cannot match
+            if self._matrix is not None and self._matrix.shape[1] == len(vector):
+                scores = self._matrix @ self._unit(vector)
+                for i in scores.argsort()[::-1]:
+                    if scores[i] < self.threshold:
+                        break
+                    if self._entries[i]["top_k"] == top_k:
+                        self.hits += 1
+                        return self._entries[i]["result"]
+            self.misses += 1
+            return None
+
+    def store(self, vector: list[float], top_k: int, result: dict, sources: dict[str, str]) -> None:
+        """Caches an answer together with the {source_path: content hash} it was built from."""
+        if self.max_entries <= 0:
+            return
+        unit = self._unit(vector)
+        with self._lock:
+            self._entries = [e for e in self._entries if len(e["vector"]) == len(unit)]
+            self._entries.append({
+                "vector": unit,
+                "top_k": top_k,
+                "result": result,
+                "sources": dict(sources),
+                "created": time.monotonic(),
+            })
+            # Oldest entries are evicted first
+            self._entries = self._entries[-self.max_entries:]
+            self._rebuild()
+
+    def observe(self, sources: dict[str, str]) -> None:
+        """Invalidates entries built from an older version of any of the given sources."""
+        with self._lock:
+            alive = [
+                e for e in self._entries
+                if all(sources.get(path, md5) == md5 for path, md5 in e["sources"].items())
+            ]
+            if len(alive) != len(self._entries):
+                self._entries = alive
+                self._rebuild()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,64 @@
+"""
+Rank fusion for hybrid retrieval: merges ranked result lists from several searches.
+
+Each ranking is a list of (document, score) pairs, best first. Documents found by
+several searches are merged into one entry (by `key`), so the fused list has no duplicates.
+"""
+
+from collections.abc import Sequence
+
+RRF_K = 60  # Rank constant from the RRF paper, also used by Azure AI Search
+
+Ranking = list[tuple[dict, float]]
+
+
+def _weights(rankings: Sequence[Ranking], weights: Sequence[float] | None) -> Sequence[float]:
+    if weights is None:
+        return [1.0] * len(rankings)
+    if len(weights) != len(rankings):
+        raise ValueError(f"{len(weights)} weights for {len(rankings)} rankings")
+    return weights
+
+
+def _sorted(fused: dict[str, list]) -> Ranking:
+    return sorted(((doc, score) for doc, score in fused.values()), key=lambda item: -item[1])
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Ranking],
+    weights: Sequence[float] | None = None,
+    k: int = RRF_K,
+    key: str = "id",
+) -> Ranking:
+    """
+    Scores every document by the weighted sum of 1 / (k + rank) over the rankings it
+    appears in (rank starting at 1). Only ranks count, so scores on different scales
+    (BM25, cosine similarity) need no calibration.
+    """
+    fused: dict[str, list] = {}
+    for ranking, weight in zip(rankings, _weights(rankings, weights)):
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            fused.setdefault(doc[key], [doc, 0.0])[1] += weight / (k + rank)
+    return _sorted(fused)
+
+
+def weighted_score_fusion(
+    rankings: Sequence[Ranking],
+    weights: Sequence[float] | None = None,
+    key: str = "id",
+) -> Ranking:
+    """
+    Scores every document by the weighted sum of its min-max normalized scores, so a
+    clear winner on one side counts for more than under RRF. A document missing from a
+    ranking gets 0 for it.
+    """
+    fused: dict[str, list] = {}
+    for ranking, weight in zip(rankings, _weights(rankings, weights)):
+        if not ranking:
+            continue
+        scores = [score for _, score in ranking]
+        low, spread = min(scores), max(scores) - min(scores)
+        for doc, score in ranking:
+            normalized = (score - low) / spread if spread else 1.0
+            fused.setdefault(doc[key], [doc, 0.0])[1] += weight * normalized
+    return _sorted(fused)
@@ -0,0 +1,188 @@
+"""
+In-process BM25 keyword index, the keyword half of hybrid search for the local backend.
+
+Posting lists are stored in CSR form: the postings of term `t` are
+`doc_ids[offsets[t]:offsets[t + 1]]` (rows of the local vector index) with their term
+frequencies in `tfs`. A query touches only the posting lists of its terms.
+
+The index is immutable; `select` (drop rows) and `extend` (append rows) return a new
+index and reuse the existing postings, so an incremental build only tokenizes the
+chunks that changed.
+"""
+
+import json
+import re
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+
+POSTINGS_FILE = "keywords.npz"
+TERMS_FILE = "terms.json"
+
+BM25_K1 = 1.2   # Term frequency saturation
+BM25_B = 0.75   # Document length normalization
+
+_TOKEN = re.compile(r"\w+")
+_MAX_TF = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def keyword_text(doc: dict) -> str:
+    """The searchable fields of a chunk, as in the Azure AI Search index."""
+    return " ".join(doc.get(field) or "" for field in ("title", "tags", "content"))
+
+
+class KeywordIndex:
+    """BM25 over row-aligned chunk texts, with postings in flat numpy arrays."""
+
+    def __init__(
+        self,
+        terms: list[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # Per-row part of the BM25 denominator, computed once instead of per query
+        self._length_norm = (
+            BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / avgdl) if avgdl else np.zeros(len(doc_lengths))
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def empty(cls) -> "KeywordIndex":
+        return cls(
+            [],
+            np.zeros(1, dtype=np.int64),
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.uint16),
+            np.zeros(0, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "KeywordIndex":
+        return cls.empty().extend(texts)
+
+    @classmethod
+    def _from_postings(
+        cls,
+        terms: list[str],
+        term_ids: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ) -> "KeywordIndex":
+        """Builds the CSR arrays from unordered (term, row, tf) postings; drops unused terms."""
+        order = np.lexsort((rows, term_ids))
+        term_ids, rows, tfs = term_ids[order], rows[order], tfs[order]
+        counts = np.bincount(term_ids, minlength=len(terms))
+        used = counts > 0
+        if not used.all():
+            terms = [term for term, keep in zip(terms, used) if keep]
+            counts = counts[used]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(terms, offsets, rows.astype(np.int32), tfs.astype(np.uint16), doc_lengths)
+
+    def _postings(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        term_ids = np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+        return term_ids, np.asarray(self.doc_ids), np.asarray(self.tfs)
+
+    def select(self, rows: np.ndarray) -> "KeywordIndex":
+        """Keeps only the given rows (in ascending order), renumbered from 0."""
+        rows = np.asarray(rows, dtype=np.int64)
+        new_row = np.full(len(self), -1, dtype=np.int64)
+        new_row[rows] = np.arange(len(rows))
+        term_ids, doc_ids, tfs = self._postings()
+        keep = new_row[doc_ids] >= 0
+        return self._from_postings(
+            self.terms, term_ids[keep], new_row[doc_ids[keep]], tfs[keep], self.doc_lengths[rows]
+        )
+
+    def extend(self, texts: Iterable[str]) -> "KeywordIndex":
+        """Appends one row per text."""
+        terms = list(self.terms)
+        term_ids = dict(self._term_ids)
+        new_terms: list[int] = []
+        new_rows: list[int] = []
+        new_tfs: list[int] = []
+        lengths: list[int] = []
+        for row, text in enumerate(texts, start=len(self)):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                if term not in term_ids:
+                    term_ids[term] = len(terms)
+                    terms.append(term)
+                new_terms.append(term_ids[term])
+                new_rows.append(row)
+                new_tfs.append(min(tf, _MAX_TF))
+
+        old_terms, old_rows, old_tfs = self._postings()
+        return self._from_postings(
+            terms,
+            np.concatenate([old_terms, np.asarray(new_terms, dtype=np.int64)]),
+            np.concatenate([old_rows.astype(np.int64), np.asarray(new_rows, dtype=np.int64)]),
+            np.concatenate([old_tfs, np.asarray(new_tfs, dtype=np.uint16)]),
+            np.concatenate([self.doc_lengths, np.asarray(lengths, dtype=np.int32)]),
+        )
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """Returns up to `top_k` (row, BM25 score) pairs, best first; rows need a query term."""
+        term_ids = {self._term_ids[t] for t in tokenize(query) if t in self._term_ids}
+        if not term_ids or top_k <= 0:
+            return []
+        n = len(self)
+        scores = np.zeros(n, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + self._length_norm[rows])
+
+        candidates = np.flatnonzero(scores)
+        k = min(top_k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in ranked]
+
+    @staticmethod
+    def exists(path: str | Path) -> bool:
+        return (Path(path) / POSTINGS_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str | Path) -> "KeywordIndex":
+        path = Path(path)
+        with np.load(path / POSTINGS_FILE) as arrays:
+            postings = {name: arrays[name] for name in ("offsets", "doc_ids", "tfs", "doc_lengths")}
+        with open(path / TERMS_FILE, encoding="utf-8") as f:
+            terms = json.load(f)
+        return cls(terms, **postings)
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        np.savez(
+            path / POSTINGS_FILE,
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths,
+        )
+        with open(path / TERMS_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.terms, f, ensure_ascii=False)
@@ -0,0 +1,300 @@
+"""
+In-process vector index: a drop-in for Azure AI Search on small deployments and in CI.
+
+An index is a directory holding
+- `vectors.npy`: float32 matrix of unit-length chunk vectors, memory-mapped on load,
+- `documents.jsonl`: the chunk fields, one line per matrix row,
+- `hnsw.bin` (optional): an hnswlib graph over the same rows for approximate search,
+- `keywords.npz`, `terms.json`: a BM25 keyword index over the same rows
+  (see `src.retrieval.keyword_index`),
+- `vectors.int8.npz` or `vectors.bits.npy` (optional): quantized codes of the vectors
+  (see `src.retrieval.quantization`).
+
+Exact search is one matrix product over all rows (several queries at once with
+`search_many`) followed by a partial sort, so it needs no service call per query.
+With quantized codes the product runs over the codes instead, and the best
+`oversampling * top_k` candidates are rescored with their float32 vectors.
+"""
+
+import json
+import logging
+import os
+import shutil
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+
+from src.retrieval import quantization
+from src.retrieval.keyword_index import KeywordIndex, keyword_text
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("id", "title", "content", "tags", "source_path", "chunk_index", "content_md5")
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+HNSW_FILE = "hnsw.bin"
+
+HNSW_M = 16                  # Graph degree
+HNSW_EF_CONSTRUCTION = 200   # Build-time candidate list size
+HNSW_EF_SEARCH = 64          # Query-time candidate list size (raised to top_k when smaller)
+DEFAULT_OVERSAMPLING = 4.0   # Quantized candidates rescored per requested result
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _hnswlib():
+    try:
+        import hnswlib
+    except ImportError as exc:
+        raise ImportError("HNSW search needs the optional 'hnswlib' package") from exc
+    return hnswlib
+
+
+class LocalVectorIndex:
+    """Chunk documents plus a row-aligned matrix of their unit vectors and keyword index."""
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        documents: list[dict],
+        hnsw=None,
+        keywords: KeywordIndex | None = None,
+        codes: "quantization.Int8Codes | quantization.BinaryCodes | None" = None,
+        oversampling: float = DEFAULT_OVERSAMPLING,
+    ):
+        if len(vectors) != len(documents):
+            raise ValueError(f"{len(vectors)} vectors for {len(documents)} documents")
+        if keywords is not None and len(keywords) != len(documents):
+            raise ValueError(f"Keyword index has {len(keywords)} rows for {len(documents)} documents")
+        self.vectors = vectors
+        self.documents = documents
+        self.hnsw = hnsw
+        self.keywords = keywords
+        self.codes = codes
+        self.oversampling = oversampling
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[1] if len(self) else 0
+
+    @classmethod
+    def from_documents(cls, docs: Iterable[dict]) -> "LocalVectorIndex":
+        """Builds an index from chunk documents carrying a `content_vector`."""
+        docs = list(docs)
+        if not docs:
+            return cls(np.zeros((0, 0), dtype=np.float32), [], keywords=KeywordIndex.empty())
+        vectors = np.asarray([doc["content_vector"] for doc in docs], dtype=np.float32)
+        documents = [{field: doc.get(field) for field in FIELDS} for doc in docs]
+        keywords = KeywordIndex.from_texts(keyword_text(doc) for doc in docs)
+        return cls(_unit_rows(vectors), documents, keywords=keywords)
+
+    @staticmethod
+    def exists(path: str | Path) -> bool:
+        return (Path(path) / VECTORS_FILE).exists()
+
+    @classmethod
+    def load(
+        cls,
+        path: str | Path,
+        hnsw: bool = False,
+        quantization_kind: str = "none",
+        oversampling: float = DEFAULT_OVERSAMPLING,
+    ) -> "LocalVectorIndex":
+        """
+        Opens an index directory; the vector matrix is memory-mapped, not read. With a
+        `quantization_kind`, searches run on its codes (encoded now if the build did not save them).
+        """
+        path = Path(path)
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        with open(path / DOCUMENTS_FILE, encoding="utf-8") as f:
+            documents = [json.loads(line) for line in f]
+
+        graph = None
+        if hnsw and len(documents):
+            if not (path / HNSW_FILE).exists():
+                raise FileNotFoundError(f"No HNSW graph in {path}; rebuild the index with HNSW on")
+            graph = _hnswlib().Index(space="ip", dim=vectors.shape[1])
+            graph.load_index(str(path / HNSW_FILE), max_elements=len(documents))
+            graph.set_ef(HNSW_EF_SEARCH)
+        keywords = KeywordIndex.load(path) if KeywordIndex.exists(path) else None
+
+        codes = None
+        if quantization_kind != "none" and len(documents):
+            codes = quantization.load(path, quantization_kind)
+            if codes is None:
+                logger.info("No %s codes in %s; encoding them now", quantization_kind, path)
+                codes = quantization.encode(vectors, quantization_kind)
+        logger.info("Loaded local index %s: %d chunks", path, len(documents))
+        return cls(vectors, documents, graph, keywords, codes, oversampling)
+
+    def save(self, path: str | Path, hnsw: bool = False, quantization_kind: str = "none") -> None:
+        """
+        Writes the index directory, with HNSW graph and quantized codes when asked. Files
+        are written next to it and swapped in at the end, so processes that have the old
+        index mapped keep a consistent view.
+        """
+        path = Path(path)
+        staging = path.with_name(path.name + ".tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        np.save(staging / VECTORS_FILE, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(staging / DOCUMENTS_FILE, "w", encoding="utf-8") as f:
+            for doc in self.documents:
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        if hnsw and len(self):
+            graph = _hnswlib().Index(space="ip", dim=self.vectors.shape[1])
+            graph.init_index(max_elements=len(self), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+            graph.add_items(np.asarray(self.vectors), np.arange(len(self)))
+            graph.save_index(str(staging / HNSW_FILE))
+        if self.keywords is not None:
+            self.keywords.save(staging)
+        if quantization_kind != "none" and len(self):
+            quantization.encode(self.vectors, quantization_kind).save(staging)
+
+        previous = path.with_name(path.name + ".old")
+        shutil.rmtree(previous, ignore_errors=True)
+        if path.exists():
+            os.replace(path, previous)
+        os.replace(staging, path)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    def search(self, vector: list[float], top_k: int) -> list[tuple[dict, float]]:
+        """Returns the `top_k` most similar chunks as (document, cosine similarity)."""
+        return self.search_many([vector], top_k)[0]
+
+    def search_many(self, vectors: list[list[float]], top_k: int) -> list[list[tuple[dict, float]]]:
+        """Batched `search`: one matrix product for all queries."""
+        if not len(self) or top_k <= 0:
+            return [[] for _ in vectors]
+        queries = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        if queries.shape[1] != self.dimensions:
+            raise ValueError(
+                f"Query vectors have {queries.shape[1]} dimensions, the index {self.dimensions}; "
+                "rebuild the index after changing EMBEDDING_DIMENSIONS"
+            )
+        k = min(top_k, len(self))
+
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(HNSW_EF_SEARCH, k))
+            labels, distances = self.hnsw.knn_query(queries, k=k)
+            return [
+                [(self.documents[row], float(1 - distance)) for row, distance in zip(rows, dists)]
+                for rows, dists in zip(labels, distances)
+            ]
+
+        if self.codes is not None:
+            return [
+                self._rescore(query, candidates, k)
+                for query, candidates in zip(queries, self._top_rows(self.codes.scores(queries), self._pool(k)))
+            ]
+
+        scores = queries @ np.asarray(self.vectors).T
+        results = []
+        for query_scores, candidates in zip(scores, self._top_rows(scores, k)):
+            ranked = candidates[np.argsort(-query_scores[candidates])]
+            results.append([(self.documents[row], float(query_scores[row])) for row in ranked])
+        return results
+
+    def _pool(self, k: int) -> int:
+        return min(len(self), max(k, int(np.ceil(k * self.oversampling))))
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+        """Unordered indexes of the k highest scores per row of `scores`."""
+        if k >= scores.shape[1]:
+            return np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+    def _rescore(self, query: np.ndarray, candidates: np.ndarray, k: int) -> list[tuple[dict, float]]:
+        """Ranks quantized candidates by their exact similarity, reading only their rows."""
+        rows = np.sort(candidates)  # Ascending rows read the memory map sequentially
+        exact = np.asarray(self.vectors[rows]) @ query
+        best = np.argsort(-exact)[:k]
+        return [(self.documents[rows[i]], float(exact[i])) for i in best]
+
+    def keyword_search(self, query: str, top_k: int) -> list[tuple[dict, float]]:
+        """Returns the `top_k` best BM25 matches as (document, score)."""
+        if self.keywords is None:
+            raise ValueError("This local index has no keyword index; rebuild it")
+        return [(self.documents[row], score) for row, score in self.keywords.search(query, top_k)]
+
+
+class LocalIndexWriter:
+    """
+    Collects chunk documents for a local index: add, delete per note, then build.
+    Rows of an existing index that survive keep their vectors and keyword postings;
+    only added chunks are normalized and tokenized.
+    """
+
+    def __init__(self, existing: LocalVectorIndex | None = None):
+        self._existing = existing
+        self._kept = np.ones(len(existing) if existing else 0, dtype=bool)
+        self._rows = {doc["id"]: row for row, doc in enumerate(existing.documents)} if existing else {}
+        self._added: dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return int(self._kept.sum()) + len(self._added)
+
+    def _documents(self) -> Iterable[dict]:
+        if self._existing is not None:
+            for row in np.flatnonzero(self._kept):
+                yield self._existing.documents[row]
+        yield from self._added.values()
+
+    def notes(self) -> dict[str, dict]:
+        """Current state per note, in the shape of `build_index.fetch_indexed_notes`."""
+        notes: dict[str, dict] = {}
+        for doc in self._documents():
+            note = notes.setdefault(doc["source_path"], {"md5": set(), "ids": []})
+            note["md5"].add(doc.get("content_md5") or "")
+            note["ids"].append(doc["id"])
+        return notes
+
+    def add(self, docs: Iterable[dict]) -> None:
+        for doc in docs:
+            row = self._rows.get(doc["id"])
+            if row is not None:
+                self._kept[row] = False
+            self._added[doc["id"]] = doc
+
+    def delete_sources(self, paths: Iterable[str]) -> int:
+        """Removes every chunk of the given notes. Returns the number removed."""
+        paths = set(paths)
+        removed = 0
+        if self._existing is not None:
+            for row in np.flatnonzero(self._kept):
+                if self._existing.documents[row]["source_path"] in paths:
+                    self._kept[row] = False
+                    removed += 1
+        stale = [doc_id for doc_id, doc in self._added.items() if doc["source_path"] in paths]
+        for doc_id in stale:
+            del self._added[doc_id]
+        return removed + len(stale)
+
+    def build(self) -> LocalVectorIndex:
+        existing = self._existing
+        if existing is None:
+            return LocalVectorIndex.from_documents(self._added.values())
+
+        kept = np.flatnonzero(self._kept)
+        added = list(self._added.values())
+        keywords = existing.keywords
+        if keywords is None:  # Index written before it had keyword search
+            keywords = KeywordIndex.from_texts(keyword_text(doc) for doc in existing.documents)
+
+        vectors = np.asarray(existing.vectors, dtype=np.float32)[kept]
+        if added:
+            new_vectors = _unit_rows(np.asarray([doc["content_vector"] for doc in added], dtype=np.float32))
+            vectors = np.concatenate([vectors.reshape(-1, new_vectors.shape[1]), new_vectors])
+        documents = [existing.documents[row] for row in kept]
+        documents += [{field: doc.get(field) for field in FIELDS} for doc in added]
+        keywords = keywords.select(kept).extend(keyword_text(doc) for doc in added)
+        return LocalVectorIndex(vectors, documents, keywords=keywords)
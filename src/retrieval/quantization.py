@@ -0,0 +1,108 @@
+"""
+Compressed codes of the local index vectors, searched first and rescored at full precision.
+
+- int8: every dimension scaled by its largest absolute value to [-127, 127]; 4x smaller
+  than float32, similarity estimates are close to exact.
+- binary: one sign bit per dimension, compared by Hamming distance; 32x smaller, a
+  coarse estimate that needs more oversampling.
+
+The float32 vectors stay on disk (memory-mapped) and only the rows of the top
+candidates are read for rescoring, so the codes are all that has to be resident.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+_BLOCK_ROWS = 2048  # Rows converted to float32 at a time; small blocks stay in the CPU cache
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class Int8Codes:
+    kind = "int8"
+    FILE = "vectors.int8.npz"
+
+    def __init__(self, codes: np.ndarray, scale: np.ndarray):
+        self.codes = codes
+        self.scale = scale
+
+    @classmethod
+    def encode(cls, vectors: np.ndarray) -> "Int8Codes":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        scale = np.abs(vectors).max(axis=0) / 127 if len(vectors) else np.ones(vectors.shape[1])
+        scale = np.where(scale == 0, 1, scale).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+        return cls(codes, scale)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scale.nbytes
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate dot products, shape (queries, rows)."""
+        scaled = (queries * self.scale).T.astype(np.float32)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), _BLOCK_ROWS):
+            block = self.codes[start:start + _BLOCK_ROWS]
+            out[:, start:start + len(block)] = (block.astype(np.float32) @ scaled).T
+        return out
+
+    def save(self, path: Path) -> None:
+        np.savez(path / self.FILE, codes=self.codes, scale=self.scale)
+
+    @classmethod
+    def load(cls, path: Path) -> "Int8Codes":
+        with np.load(path / cls.FILE) as arrays:
+            return cls(arrays["codes"], arrays["scale"])
+
+
+class BinaryCodes:
+    kind = "binary"
+    FILE = "vectors.bits.npy"
+
+    def __init__(self, bits: np.ndarray, dimensions: int):
+        self.bits = bits
+        self.dimensions = dimensions
+
+    @classmethod
+    def encode(cls, vectors: np.ndarray) -> "BinaryCodes":
+        vectors = np.asarray(vectors)
+        return cls(np.packbits(vectors > 0, axis=1), vectors.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Matching minus differing sign bits (higher is more similar), shape (queries, rows)."""
+        packed = np.packbits(queries > 0, axis=1)
+        out = np.empty((len(queries), len(self.bits)), dtype=np.float32)
+        for i, query in enumerate(packed):
+            hamming = _POPCOUNT[np.bitwise_xor(self.bits, query)].sum(axis=1, dtype=np.int32)
+            out[i] = self.dimensions - 2 * hamming
+        return out
+
+    def save(self, path: Path) -> None:
+        np.save(path / self.FILE, self.bits)
+
+    @classmethod
+    def load(cls, path: Path) -> "BinaryCodes":
+        bits = np.load(path / cls.FILE)
+        return cls(bits, bits.shape[1] * 8)
+
+
+_CODES = {codes.kind: codes for codes in (Int8Codes, BinaryCodes)}
+
+
+def encode(vectors: np.ndarray, kind: str) -> Int8Codes | BinaryCodes:
+    if kind not in _CODES:
+        raise ValueError(f"Unknown vector quantization {kind!r}; use one of {QUANTIZATIONS}")
+    return _CODES[kind].encode(vectors)
+
+
+def load(path: str | Path, kind: str) -> Int8Codes | BinaryCodes | None:
+    """Loads the codes of `kind` saved with an index, or None when there are none."""
+    codes = _CODES[kind]
+    return codes.load(Path(path)) if (Path(path) / codes.FILE).exists() else None
@@ -1,14 +1,38 @@
 """
 Phase 3 – RAG Retrieval: Fetches relevant notes from Azure AI Search
 and answers questions via GPT-4o on Azure.
+
+Every step has a synchronous and an async (`a`-prefixed) variant; the FastAPI app
+uses the async ones so slow searches or completions never block the event loop.
 """
 
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.models import VectorizedQuery
-from openai import AzureOpenAI
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TYPE_CHECKING, Any
+
+from src.config import get_settings
+from src.ratelimit import embedding_limiter, estimate_tokens
+from src.retrieval.cache import SemanticCache, TTLCache, normalize_query
+from src.retrieval.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from src.retrieval.retrievers import (
+    SEARCH_FIELDS,
+    AzureSearchRetriever,
+    LocalRetriever,
+    Retriever,
+    to_context_doc,
+)
 
-from src.config import settings
+if TYPE_CHECKING:
+    from azure.search.documents import SearchClient
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    from openai import AsyncAzureOpenAI, AzureOpenAI
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """You are a smart knowledge assistant that answers questions based on
 the user's personal notes. Use ONLY the provided context.
@@ -16,91 +40,533 @@ If the answer is not in the context, say so honestly.
 Always respond in the same language as the question.
 """
 
-# ── Clients (created once at import) ─────────────────────────────────────────
-_search_client = SearchClient(
-    settings.azure_search_service_endpoint,
-    settings.azure_search_index_name,
-    AzureKeyCredential(settings.azure_search_admin_key),
-)
-_openai_client = AzureOpenAI(
-    azure_endpoint=settings.azure_openai_endpoint,
-    api_key=settings.azure_openai_api_key,
-    api_version="2024-02-01",
-)
+NO_CONTEXT_ANSWER = "No relevant notes found to answer the question."
+
+LATENCY_WINDOW = 1000  # Recent retrievals kept per stage for `retrieval_stats`
+
+# ── Clients and caches (created on first use) ───────────────────────────────
+# The Azure and OpenAI SDKs are imported inside the factories, so importing this module
+# (and the API) stays cheap; the API lifespan warms them up and closes them again.
+_search_client: "SearchClient | None" = None
+_openai_client: "AzureOpenAI | None" = None
+_async_search_client: "AsyncSearchClient | None" = None
+_async_openai_client: "AsyncAzureOpenAI | None" = None
+_query_vector_cache: TTLCache | None = None
+_answer_cache: SemanticCache | None = None
+_retriever: Retriever | None = None
+_lazy_lock = threading.Lock()
+
 
+def _lazy(name: str, factory: Callable[[], Any]) -> Any:
+    """Returns the module global `name`, creating it with `factory` on first access."""
+    value = globals()[name]
+    if value is None:
+        with _lazy_lock:
+            value = globals()[name]
+            if value is None:
+                value = globals()[name] = factory()
+    return value
+
+
+def _new_search_client(asynchronous: bool = False):
+    from azure.core.credentials import AzureKeyCredential
+
+    if asynchronous:
+        from azure.search.documents.aio import SearchClient as client_class
+    else:
+        from azure.search.documents import SearchClient as client_class
+    settings = get_settings()
+    return client_class(
+        settings.azure_search_service_endpoint,
+        settings.azure_search_index_name,
+        AzureKeyCredential(settings.azure_search_admin_key),
+    )
+
+
+def _new_openai_client(asynchronous: bool = False):
+    from openai import AsyncAzureOpenAI, AzureOpenAI
+
+    settings = get_settings()
+    return (AsyncAzureOpenAI if asynchronous else AzureOpenAI)(
+        azure_endpoint=settings.azure_openai_endpoint,
+        api_key=settings.azure_openai_api_key,
+        api_version="2024-02-01",
+    )
 
-def retrieve_context(query: str, top_k: int = 5) -> list[dict]:
+
+def search_client() -> "SearchClient":
+    return _lazy("_search_client", _new_search_client)
+
+
+def openai_client() -> "AzureOpenAI":
+    return _lazy("_openai_client", _new_openai_client)
+
+
+def async_search_client() -> "AsyncSearchClient":
+    return _lazy("_async_search_client", lambda: _new_search_client(asynchronous=True))
+
+
+def async_openai_client() -> "AsyncAzureOpenAI":
+    return _lazy("_async_openai_client", lambda: _new_openai_client(asynchronous=True))
+
+
+def _live_index():
+    """Reads the definition of the index the API queries (the target, if it is an alias)."""
+    from azure.core.credentials import AzureKeyCredential
+    from azure.search.documents.indexes import SearchIndexClient
+
+    from src.ingestion.index_versions import resolve_index_name
+
+    settings = get_settings()
+    with SearchIndexClient(
+        settings.azure_search_service_endpoint,
+        AzureKeyCredential(settings.azure_search_admin_key),
+        retry_total=0,
+    ) as client:
+        return client.get_index(resolve_index_name(client, settings.azure_search_index_name))
+
+
+def _index_schema() -> tuple[list[str], int | None]:
     """
-    Performs a hybrid search (vector + keyword) in Azure AI Search.
-    Returns a list of relevant chunks.
+    The fields of `SEARCH_FIELDS` the live index has, and the size of its vectors. An index
+    built by an older release lacks `content_md5`, and selecting an unknown field fails
+    every search; after a blue/green rebuild to another `EMBEDDING_DIMENSIONS`, queries
+    must be embedded at the new size. Falls back to all fields and an unknown size.
     """
+    try:
+        fields = {field.name: field for field in _live_index().fields}
+    except Exception as exc:
+        logger.warning("Could not read the search index definition, selecting all fields: %s", exc)
+        return SEARCH_FIELDS, None
+    missing = [name for name in SEARCH_FIELDS if name not in fields]
+    if missing:
+        logger.warning("Search index lacks %s; re-run build_index to add it", ", ".join(missing))
+    vector_field = fields.get("content_vector")
+    dimensions = getattr(vector_field, "vector_search_dimensions", None)
+    return [name for name in SEARCH_FIELDS if name in fields], dimensions
+
+
+def _new_retriever() -> Retriever:
+    settings = get_settings()
+    if settings.retrieval_backend == "local":
+        from src.retrieval.local_index import LocalVectorIndex
+
+        return LocalRetriever(
+            LocalVectorIndex.load(
+                settings.local_index_path,
+                hnsw=settings.local_index_hnsw,
+                quantization_kind=settings.vector_quantization,
+                oversampling=settings.vector_oversampling,
+            )
+        )
+    if settings.retrieval_backend != "azure":
+        raise ValueError(f"Unknown retrieval backend: {settings.retrieval_backend!r}")
+    select, dimensions = _index_schema()
+    return AzureSearchRetriever(search_client, async_search_client, select=select, dimensions=dimensions)
 
-    # Generate query vector
-    embedding_response = _openai_client.embeddings.create(
-        model=settings.azure_openai_embedding_deployment,
-        input=query,
+
+def retriever() -> Retriever:
+    return _lazy("_retriever", _new_retriever)
+
+
+def query_dimensions() -> int:
+    """Size of query embeddings: that of the live index, else `embedding_dimensions`."""
+    return retriever().dimensions or get_settings().embedding_dimensions
+
+
+def _index_resized() -> bool:
+    """
+    Re-reads the live Azure index after a failed vector search. Returns True when its
+    vector size changed, i.e. the alias now points at a version rebuilt at another size.
+    """
+    search = retriever()
+    if not isinstance(search, AzureSearchRetriever):
+        return False
+    select, dimensions = _index_schema()
+    if dimensions is None or dimensions == search.dimensions:
+        return False
+    logger.info("Search index vectors changed from %s to %d dimensions", search.dimensions, dimensions)
+    search.select, search.dimensions = select, dimensions
+    return True
+
+
+def query_vector_cache() -> TTLCache:
+    settings = get_settings()
+    return _lazy(
+        "_query_vector_cache",
+        lambda: TTLCache(
+            max_entries=settings.query_cache_max_entries,
+            ttl=settings.query_cache_ttl_seconds,
+        ),
     )
-    query_vector = embedding_response.data[0].embedding
 
-    vector_query = VectorizedQuery(
-        vector=query_vector,
-        k_nearest_neighbors=top_k,
-        fields="content_vector",
+
+def answer_cache() -> SemanticCache:
+    settings = get_settings()
+    return _lazy(
+        "_answer_cache",
+        lambda: SemanticCache(
+            max_entries=settings.semantic_cache_max_entries,
+            ttl=settings.semantic_cache_ttl_seconds,
+            threshold=settings.semantic_cache_threshold,
+        ),
     )
 
-    results = _search_client.search(
-        search_text=query,              # Keyword component
-        vector_queries=[vector_query],   # Vector component
-        select=["title", "content", "tags", "source_path"],
-        top=top_k,
+
+def embed_query(query: str) -> list[float]:
+    """
+    Returns the embedding of a query at the size of the live index, served from the
+    in-process cache when possible.
+    """
+    dimensions = query_dimensions()
+    key = (dimensions, normalize_query(query))
+    cache = query_vector_cache()
+    vector = cache.get(key)
+    if vector is None:
+        embedding_response = embedding_limiter().call_raw(
+            # 429s must reach the shared limiter (AIMD, Retry-After pause), not SDK retries
+            openai_client().with_options(max_retries=0).embeddings.with_raw_response.create,
+            model=get_settings().azure_openai_embedding_deployment,
+            input=query,
+            **get_settings().embedding_options(dimensions),
+            tokens=estimate_tokens(query),
+        )
+        vector = embedding_response.data[0].embedding
+        cache.set(key, vector)
+    return vector
+
+
+async def aembed_query(query: str) -> list[float]:
+    """Async variant of `embed_query`."""
+    dimensions = query_dimensions()
+    key = (dimensions, normalize_query(query))
+    cache = query_vector_cache()
+    vector = cache.get(key)
+    if vector is None:
+        embedding_response = await embedding_limiter().acall_raw(
+            async_openai_client().with_options(max_retries=0).embeddings.with_raw_response.create,
+            model=get_settings().azure_openai_embedding_deployment,
+            input=query,
+            **get_settings().embedding_options(dimensions),
+            tokens=estimate_tokens(query),
+        )
+        vector = embedding_response.data[0].embedding
+        cache.set(key, vector)
+    return vector
+
+
+async def aclose_clients() -> None:
+    """
+    Closes the connection pools of every client created so far (called on API shutdown);
+    the next call creates fresh clients.
+    """
+    global _search_client, _openai_client, _async_search_client, _async_openai_client
+    with _lazy_lock:
+        clients = [_search_client, _openai_client, _async_search_client, _async_openai_client]
+        _search_client = _openai_client = _async_search_client = _async_openai_client = None
+    sync_clients, async_clients = clients[:2], clients[2:]
+    for client in sync_clients:
+        if client is not None:
+            client.close()
+    for client in async_clients:
+        if client is not None:
+            await client.close()
+
+
+async def awarm_up(timeout: float = 10.0) -> dict[str, float]:
+    """
+    Prepares for the first request: imports the SDKs, creates the async clients and
+    caches, creates the retriever (loading a local index), and makes one cheap call to
+    each service (document count of the index, model list) so TLS connections are
+    already pooled. Returns the duration of each step in seconds; failures are logged,
+    never raised, so the API starts even if, say, the local index is missing.
+    """
+    timings: dict[str, float] = {}
+    use_azure_search = get_settings().retrieval_backend == "azure"
+
+    start = time.perf_counter()
+    for create in (async_openai_client, query_vector_cache, answer_cache):
+        create()
+    if use_azure_search:
+        async_search_client()
+    timings["clients"] = time.perf_counter() - start
+
+    async def step(name: str, call: Callable[[], Awaitable[Any]]) -> None:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(call(), timeout)
+        except Exception as exc:
+            logger.warning("Warm-up of %s failed: %s", name, exc)
+        timings[name] = time.perf_counter() - start
+
+    # No SDK retries: a failed warm-up must not hold up startup
+    steps = [
+        step("openai", lambda: async_openai_client().with_options(max_retries=0).models.list()),
+        step("retriever", lambda: asyncio.to_thread(retriever)),  # May read a local index from disk
+    ]
+    if use_azure_search:
+        steps.append(
+            step("search", lambda: async_search_client().get_document_count(retry_total=0))
+        )
+    await asyncio.gather(*steps)
+    return timings
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the retrieval caches."""
+    return {
+        "query_embeddings": query_vector_cache().stats(),
+        "answers": answer_cache().stats(),
+    }
+
+
+# ── Hybrid retrieval ────────────────────────────────────────────────────────
+# Keyword and vector candidates are fetched separately (`retrieval_candidates` per side,
+# more than top_k so that chunks ranked well by only one side still reach the fusion)
+# and fused here, instead of leaving the mix to the search service.
+_stage_latencies: defaultdict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+
+def _record(timings: dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        _stage_latencies[stage].append(seconds)
+    logger.debug("Retrieval timings (ms): %s", {s: round(t * 1000, 1) for s, t in timings.items()})
+
+
+def retrieval_stats() -> dict:
+    """Median and 95th percentile latency per retrieval stage over recent queries, in ms."""
+    stats = {}
+    for stage, samples in list(_stage_latencies.items()):
+        ordered = sorted(samples)
+        stats[stage] = {
+            "count": len(ordered),
+            "p50_ms": round(statistics.median(ordered) * 1000, 2),
+            "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 2),
+        }
+    return stats
+
+
+def _timed(timings: dict[str, float], stage: str, func: Callable, *args: Any) -> Any:
+    start = time.perf_counter()
+    result = func(*args)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+async def _atimed(timings: dict[str, float], stage: str, func: Callable, *args: Any) -> Any:
+    start = time.perf_counter()
+    result = await func(*args)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+async def _no_hits(*_: Any) -> list:
+    return []
+
+
+def _vector_hits(query: str, query_vector: list[float], k: int, timings: dict[str, float]) -> list:
+    """Vector search; re-embeds and retries once when the live index changed its vector size."""
+    try:
+        return _timed(timings, "vector", retriever().vector_search, query_vector, k)
+    except Exception:
+        if not _index_resized():
+            raise
+    return _timed(timings, "vector", retriever().vector_search, embed_query(query), k)
+
+
+async def _avector_hits(query: str, query_vector: list[float], k: int, timings: dict[str, float]) -> list:
+    """Async variant of `_vector_hits`."""
+    try:
+        return await _atimed(timings, "vector", retriever().avector_search, query_vector, k)
+    except Exception:
+        if not await asyncio.to_thread(_index_resized):
+            raise
+    return await _atimed(timings, "vector", retriever().avector_search, await aembed_query(query), k)
+
+
+def fuse_results(keyword_hits: list, vector_hits: list, top_k: int) -> list[dict]:
+    """Fuses keyword and vector hits with the configured method; returns the top_k chunks."""
+    settings = get_settings()
+    rankings = [keyword_hits, vector_hits]
+    weights = [settings.retrieval_keyword_weight, settings.retrieval_vector_weight]
+    if settings.retrieval_fusion == "rrf":
+        fused = reciprocal_rank_fusion(rankings, weights, k=settings.retrieval_rrf_k)
+    elif settings.retrieval_fusion == "weighted":
+        fused = weighted_score_fusion(rankings, weights)
+    else:
+        raise ValueError(f"Unknown fusion method: {settings.retrieval_fusion!r}")
+    return [to_context_doc(doc) for doc, _ in fused[:top_k]]
+
+
+def retrieve_context(query: str, top_k: int = 5, timings: dict | None = None) -> list[dict]:
+    """
+    Finds the chunks most relevant to a query: keyword and vector search with the
+    configured retriever (Azure AI Search or the local index), fused into one ranking.
+    Returns a list of chunks; pass `timings` to receive the seconds spent per stage.
+    """
+    settings = get_settings()
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    candidates = max(top_k, settings.retrieval_candidates)
+
+    query_vector = _timed(timings, "embed", embed_query, query)
+    keyword_hits = vector_hits = []
+    if settings.retrieval_keyword_weight > 0:
+        keyword_hits = _timed(timings, "keyword", retriever().keyword_search, query, candidates)
+    if settings.retrieval_vector_weight > 0:
+        vector_hits = _vector_hits(query, query_vector, candidates, timings)
+    docs = _timed(timings, "fusion", fuse_results, keyword_hits, vector_hits, top_k)
+
+    timings["total"] = time.perf_counter() - start
+    _record(timings)
+    return docs
+
+
+async def aretrieve_context(query: str, top_k: int = 5, timings: dict | None = None) -> list[dict]:
+    """Async variant of `retrieve_context`; both searches run concurrently."""
+    settings = get_settings()
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    candidates = max(top_k, settings.retrieval_candidates)
+
+    query_vector = await _atimed(timings, "embed", aembed_query, query)
+    search = retriever()
+    keyword_hits, vector_hits = await asyncio.gather(
+        _atimed(timings, "keyword", search.akeyword_search, query, candidates)
+        if settings.retrieval_keyword_weight > 0 else _no_hits(),
+        _avector_hits(query, query_vector, candidates, timings)
+        if settings.retrieval_vector_weight > 0 else _no_hits(),
     )
+    docs = _timed(timings, "fusion", fuse_results, keyword_hits, vector_hits, top_k)
+
+    timings["total"] = time.perf_counter() - start
+    _record(timings)
+    return docs
 
+
+def build_messages(question: str, context_docs: list[dict]) -> list[dict]:
+    """Builds the chat messages: system prompt plus the retrieved context and question."""
+    context_text = "\n\n---\n\n".join(
+        f"**{doc['title']}**\n{doc['content']}" for doc in context_docs
+    )
     return [
+        {"role": "system", "content": SYSTEM_PROMPT},
         {
-            "title": r["title"],
-            "content": r["content"],
-            "tags": r.get("tags", ""),
-            "source_path": r["source_path"],
-        }
-        for r in results
+            "role": "user",
+            "content": f"Context from my notes:\n\n{context_text}\n\nQuestion: {question}",
+        },
     ]
 
 
+def _sources(context_docs: list[dict]) -> list[dict]:
+    return [{"title": doc["title"], "path": doc["source_path"]} for doc in context_docs]
+
+
+def _source_versions(context_docs: list[dict]) -> dict[str, str]:
+    """Records the note versions a search returned and invalidates stale cached answers."""
+    versions = {doc["source_path"]: doc["content_md5"] for doc in context_docs}
+    answer_cache().observe(versions)
+    return versions
+
+
 def ask(question: str, top_k: int = 5) -> dict:
     """
     Core function of the RAG pipeline:
     1. Fetch relevant context from Azure AI Search.
     2. Send question + context to GPT-4o.
     3. Return answer + sources.
+
+    A semantically equivalent earlier question is answered from the cache,
+    skipping both steps.
     """
+    question_vector = embed_query(question)
+    cached = answer_cache().lookup(question_vector, top_k)
+    if cached is not None:
+        return cached
+
     context_docs = retrieve_context(question, top_k=top_k)
+    source_versions = _source_versions(context_docs)
 
     if not context_docs:
-        return {
-            "answer": "No relevant notes found to answer the question.",
-            "sources": [],
-        }
+        return {"answer": NO_CONTEXT_ANSWER, "sources": []}
 
-    context_text = "\n\n---\n\n".join(
-        f"**{doc['title']}**\n{doc['content']}" for doc in context_docs
+    response = openai_client().chat.completions.create(
+        model=get_settings().azure_openai_deployment_name,
+        messages=build_messages(question, context_docs),
+        temperature=0.3,
+        max_tokens=1000,
+    )
+
+    result = {"answer": response.choices[0].message.content, "sources": _sources(context_docs)}
+    answer_cache().store(question_vector, top_k, result, source_versions)
+    return result
+
+
+async def aask(question: str, top_k: int = 5) -> dict:
+    """Async variant of `ask`; same steps, caches and result shape."""
+    question_vector = await aembed_query(question)
+    cached = answer_cache().lookup(question_vector, top_k)
+    if cached is not None:
+        return cached
+
+    context_docs = await aretrieve_context(question, top_k=top_k)
+    source_versions = _source_versions(context_docs)
+
+    if not context_docs:
+        return {"answer": NO_CONTEXT_ANSWER, "sources": []}
+
+    response = await async_openai_client().chat.completions.create(
+        model=get_settings().azure_openai_deployment_name,
+        messages=build_messages(question, context_docs),
+        temperature=0.3,
+        max_tokens=1000,
     )
 
-    response = _openai_client.chat.completions.create(
-        model=settings.azure_openai_deployment_name,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": f"Context from my notes:\n\n{context_text}\n\nQuestion: {question}",
-            },
-        ],
+    result = {"answer": response.choices[0].message.content, "sources": _sources(context_docs)}
+    answer_cache().store(question_vector, top_k, result, source_versions)
+    return result
+
+
+async def aask_stream(question: str, top_k: int = 5) -> AsyncIterator[dict]:
+    """
+    Streaming variant of `aask`. Yields events as they become available:
+    - {"event": "sources", "data": [...]} right after retrieval,
+    - {"event": "token", "data": "..."} for each piece of the generated answer,
+    - {"event": "done", "data": None} at the end.
+    """
+    question_vector = await aembed_query(question)
+    cached = answer_cache().lookup(question_vector, top_k)
+    if cached is not None:
+        yield {"event": "sources", "data": cached["sources"]}
+        yield {"event": "token", "data": cached["answer"]}
+        yield {"event": "done", "data": None}
+        return
+
+    context_docs = await aretrieve_context(question, top_k=top_k)
+    source_versions = _source_versions(context_docs)
+    sources = _sources(context_docs)
+    yield {"event": "sources", "data": sources}
+
+    if not context_docs:
+        yield {"event": "token", "data": NO_CONTEXT_ANSWER}
+        yield {"event": "done", "data": None}
+        return
+
+    stream = await async_openai_client().chat.completions.create(
+        model=get_settings().azure_openai_deployment_name,
+        messages=build_messages(question, context_docs),
         temperature=0.3,
         max_tokens=1000,
+        stream=True,
     )
+    parts: list[str] = []
+    async for chunk in stream:
+        # Azure may send chunks without choices (e.g. content filter results)
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            yield {"event": "token", "data": delta}
 
-    return {
-        "answer": response.choices[0].message.content,
-        "sources": [
-            {"title": doc["title"], "path": doc["source_path"]} for doc in context_docs
-        ],
-    }
+    result = {"answer": "".join(parts), "sources": sources}
+    answer_cache().store(question_vector, top_k, result, source_versions)
+    yield {"event": "done", "data": None}
@@ -0,0 +1,131 @@
+"""
+Retriever backends used by `rag.retrieve_context`.
+
+- `AzureSearchRetriever`: keyword and vector queries against Azure AI Search.
+- `LocalRetriever`: BM25 and vector search in an in-process `LocalVectorIndex`, no network hop.
+
+Each side returns (chunk, score) pairs, best first, with the chunk `id` for fusion;
+`rag` fuses both sides and shapes the result with `to_context_doc`.
+"""
+
+import asyncio
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from azure.search.documents import SearchClient
+    from azure.search.documents.aio import SearchClient as AsyncSearchClient
+    from azure.search.documents.models import VectorizedQuery
+
+    from src.retrieval.local_index import LocalVectorIndex
+
+SEARCH_FIELDS = ["id", "title", "content", "tags", "source_path", "content_md5"]
+
+Hits = list[tuple[dict, float]]
+
+
+class Retriever(Protocol):
+    dimensions: int | None  # Size of the index's vectors (query embeddings must match); None if unknown
+
+    def keyword_search(self, query: str, k: int) -> Hits:
+        """Returns the `k` best keyword matches for a query."""
+        ...
+
+    def vector_search(self, vector: list[float], k: int) -> Hits:
+        """Returns the `k` chunks nearest to a query embedding."""
+        ...
+
+    async def akeyword_search(self, query: str, k: int) -> Hits:
+        """Async variant of `keyword_search`."""
+        ...
+
+    async def avector_search(self, vector: list[float], k: int) -> Hits:
+        """Async variant of `vector_search`."""
+        ...
+
+
+def to_context_doc(result: dict) -> dict:
+    return {
+        "title": result["title"],
+        "content": result["content"],
+        "tags": result.get("tags") or "",
+        "source_path": result["source_path"],
+        "content_md5": result.get("content_md5") or "",
+    }
+
+
+def vector_query(vector: list[float], k: int) -> "VectorizedQuery":
+    from azure.search.documents.models import VectorizedQuery
+
+    # No per-query oversampling: it is rejected on fields without compression, and a
+    # quantized index applies the `default_oversampling` of its compression configuration
+    return VectorizedQuery(vector=vector, k_nearest_neighbors=k, fields="content_vector")
+
+
+class AzureSearchRetriever:
+    """Azure AI Search; clients are passed as (lazy) getters."""
+
+    def __init__(
+        self,
+        client: Callable[[], "SearchClient"],
+        async_client: Callable[[], "AsyncSearchClient"],
+        select: list[str] = SEARCH_FIELDS,
+        dimensions: int | None = None,
+    ):
+        self._client = client
+        self._async_client = async_client
+        self.select = select  # Fields to return; an index built by an older release lacks some
+        self.dimensions = dimensions
+
+    def keyword_search(self, query: str, k: int) -> Hits:
+        results = self._client().search(search_text=query, select=self.select, top=k)
+        return [(r, r["@search.score"]) for r in results]
+
+    def vector_search(self, vector: list[float], k: int) -> Hits:
+        results = self._client().search(
+            search_text=None,
+            vector_queries=[vector_query(vector, k)],
+            select=self.select,
+            top=k,
+        )
+        return [(r, r["@search.score"]) for r in results]
+
+    async def akeyword_search(self, query: str, k: int) -> Hits:
+        results = await self._async_client().search(search_text=query, select=self.select, top=k)
+        return [(r, r["@search.score"]) async for r in results]
+
+    async def avector_search(self, vector: list[float], k: int) -> Hits:
+        results = await self._async_client().search(
+            search_text=None,
+            vector_queries=[vector_query(vector, k)],
+            select=self.select,
+            top=k,
+        )
+        return [(r, r["@search.score"]) async for r in results]
+
+
+class LocalRetriever:
+    """Search in a local index built by `build_index --backend local`."""
+
+    def __init__(self, index: "LocalVectorIndex"):
+        self.index = index
+
+    @property
+    def dimensions(self) -> int:
+        return self.index.dimensions
+
+    def keyword_search(self, query: str, k: int) -> Hits:
+        if self.index.keywords is None:  # Index built before it had keyword search
+            return []
+        return self.index.keyword_search(query, k)
+
+    def vector_search(self, vector: list[float], k: int) -> Hits:
+        return self.index.search(vector, k)
+
+    # CPU-bound: an exact scan of a large index takes tens of milliseconds, which would
+    # stall every other request on the event loop (numpy releases the GIL meanwhile)
+    async def akeyword_search(self, query: str, k: int) -> Hits:
+        return await asyncio.to_thread(self.keyword_search, query, k)
+
+    async def avector_search(self, vector: list[float], k: int) -> Hits:
+        return await asyncio.to_thread(self.vector_search, vector, k)
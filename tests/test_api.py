@@ -1,7 +1,11 @@
 """Tests for the RAG API endpoints."""
 
+import os
+import subprocess
+import sys
+
 from fastapi.testclient import TestClient
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 from src.api.main import app
 
@@ -25,7 +29,7 @@ def test_ask_endpoint_success():
         "answer": "Azure is a cloud platform.",
         "sources": [{"title": "Azure Intro", "path": "azure/intro.md"}],
     }
-    with patch("src.api.main.ask", return_value=mock_result):
+    with patch("src.api.main.aask", AsyncMock(return_value=mock_result)):
         response = client.post("/ask", json={"question": "What is Azure?"})
     assert response.status_code == 200
     data = response.json()
@@ -40,6 +44,57 @@ def test_ask_endpoint_validation_error():
 
 
 def test_ask_endpoint_server_error():
-    with patch("src.api.main.ask", side_effect=Exception("Azure is down")):
+    with patch("src.api.main.aask", AsyncMock(side_effect=Exception("Azure is down"))):
         response = client.post("/ask", json={"question": "What is my schedule?"})
     assert response.status_code == 500
+
+
+def test_stats():
+    response = client.get("/stats")
+    assert response.status_code == 200
+    assert "query_embeddings" in response.json()["caches"]
+    assert "retrieval_latency" in response.json()
+
+
+def test_ask_stream_endpoint_emits_sources_then_tokens():
+    async def fake_stream(question, top_k):
+        yield {"event": "sources", "data": [{"title": "Azure Intro", "path": "azure/intro.md"}]}
+        yield {"event": "token", "data": "Azure is "}
+        yield {"event": "token", "data": "a cloud platform."}
+        yield {"event": "done", "data": None}
+
+    with patch("src.api.main.aask_stream", fake_stream):
+        response = client.post("/ask/stream", json={"question": "What is Azure?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event:")]
+    assert events == ["sources", "token", "token", "done"]
+    assert 'data: "a cloud platform."' in response.text
+
+
+def test_importing_api_defers_sdks_and_settings():
+    # No Azure settings in the environment: importing must not read them
+    env = {k: v for k, v in os.environ.items() if not k.startswith("AZURE_")}
+    code = (
+        "import sys, src.api.main; "
+        "print(sorted({'openai', 'azure.search.documents', 'numpy'} & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_lifespan_runs_warm_up_and_reports_it():
+    warm_up = AsyncMock(return_value={"clients": 0.01, "search": 0.2, "openai": 0.3})
+    with (
+        patch("src.api.main.awarm_up", warm_up),
+        patch("src.api.main.aclose_clients", AsyncMock()) as close,
+        TestClient(app) as started,
+    ):
+        response = started.get("/stats")
+
+    warm_up.assert_awaited_once()
+    close.assert_awaited_once()
+    assert set(response.json()["warmup_seconds"]) == {"openapi", "clients", "search", "openai"}
@@ -1,10 +1,43 @@
 """Tests for the ingestion module."""
 
 import hashlib
+import re
+from contextlib import ExitStack
 from pathlib import Path
-from unittest.mock import patch
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
-from src.ingestion.upload_vault import compute_md5, parse_note
+import numpy as np
+import pytest
+from azure.core.exceptions import HttpResponseError
+
+from src.config import settings
+from src.ingestion.build_index import (
+    batch_by_budget,
+    batch_by_bytes,
+    embed_documents,
+    ensure_index,
+    get_embeddings,
+    index_full,
+    index_incremental,
+    index_local,
+    index_serial,
+    plan_incremental,
+    publish_version,
+    run,
+    serialized_size,
+    skip_done,
+    upload_batch,
+)
+from src.ingestion.checkpoint import BuildJournal
+from src.ingestion.chunking import chunk_markdown, chunk_markdown_stream
+from src.ingestion.deletion import delete_ids, delete_sources, iter_ids
+from src.ingestion.embedding_cache import EmbeddingCache
+from src.ingestion.index_versions import prune_versions, swap_alias, validate_version
+from src.ingestion.pipeline import Stage, run_pipeline
+from src.ingestion import upload_vault
+from src.ingestion.upload_vault import compute_md5, note_hash, parse_note
+from src.retrieval.local_index import LocalVectorIndex
 
 
 def test_compute_md5():
@@ -31,7 +64,12 @@ This is the content of my test note.
     assert "azure" in result["tags"]
     assert "python" in result["tags"]
     assert "This is the content" in result["content"]
-    assert result["md5"] == compute_md5(result["content"])
+    assert result["md5"] == note_hash(result["content"], "test_note", result["tags"])
+
+
+def test_note_hash_changes_with_tags_alone():
+    assert note_hash("text", "note", ["a"]) != note_hash("text", "note", ["a", "b"])
+    assert note_hash("text", "note", ["a"]) != note_hash("text", "renamed", ["a"])
 
 
 def test_parse_note_no_frontmatter(tmp_path: Path):
@@ -45,3 +83,663 @@ def test_parse_note_no_frontmatter(tmp_path: Path):
     assert result["title"] == "plain"
     assert result["tags"] == []
     assert "No frontmatter" in result["content"]
+
+
+def test_batch_by_budget_respects_item_and_token_limits():
+    docs = [{"id": str(i), "content": "x" * 40} for i in range(5)]  # ~11 tokens each
+    assert [len(b) for b in batch_by_budget(docs, max_items=2, max_tokens=1000)] == [2, 2, 1]
+    assert [len(b) for b in batch_by_budget(docs, max_items=10, max_tokens=25)] == [2, 2, 1]
+
+
+def _embeddings_client(*items) -> MagicMock:
+    """Client whose `embeddings.with_raw_response.create` returns `items` as the response data."""
+    client = MagicMock()
+    parsed = SimpleNamespace(data=list(items))
+    client.embeddings.with_raw_response.create.return_value = SimpleNamespace(headers={}, parse=lambda: parsed)
+    return client
+
+
+def test_embed_documents_maps_vectors_to_ids():
+    # The service may return items out of order; they are matched back via .index
+    client = _embeddings_client(
+        SimpleNamespace(index=1, embedding=[1.0]),
+        SimpleNamespace(index=0, embedding=[0.0]),
+    )
+    docs = [{"id": "a", "content": "first"}, {"id": "b", "content": "second"}]
+
+    with patch("src.ingestion.build_index.get_embedding_cache", return_value=None):
+        vectors = embed_documents(client, docs)
+
+    assert vectors == {"a": [0.0], "b": [1.0]}
+    assert client.embeddings.with_raw_response.create.call_args.kwargs["input"] == ["first", "second"]
+
+
+def _pairs(items):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == 2:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def test_run_pipeline_runs_all_stages():
+    stages = [
+        Stage("square", lambda x: [x * x], workers=4),
+        Stage("pairs", _pairs, stream=True),
+        Stage("sum", lambda pair: [sum(pair)], workers=2),
+    ]
+    results = run_pipeline(range(10), stages, queue_size=2)
+    assert sum(results) == sum(x * x for x in range(10))
+    assert len(results) == 5
+
+
+def test_run_pipeline_propagates_stage_errors():
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("boom")
+        return [x]
+
+    with pytest.raises(ValueError, match="boom"):
+        run_pipeline(range(1000), [Stage("fail", fail_on_three, workers=3)], queue_size=1)
+
+
+def _blob(name: str, md5: str = "") -> SimpleNamespace:
+    return SimpleNamespace(name=name, metadata={"md5": md5} if md5 else {}, content_settings=None)
+
+
+def test_build_journal_resumes_unfinished_build(tmp_path: Path):
+    path = tmp_path / "checkpoint.sqlite"
+    done = [{"id": "d0", "source_path": "done.md"}, {"id": "d1", "source_path": "done.md"}]
+    half = [{"id": "h0", "source_path": "half.md"}, {"id": "h1", "source_path": "half.md"}]
+
+    journal = BuildJournal(path)
+    assert journal.begin("full", "idx") is False
+    journal.record_chunks("done.md", "aaa", done)
+    journal.record_chunks("half.md", "bbb", half)
+    journal.record_chunks("empty.md", "ccc", [])
+    journal.record_embedded(done + half)
+    journal.record_uploaded(done + half[:1])
+    journal.close()  # The build dies here
+
+    journal = BuildJournal(path)
+    assert journal.begin("full", "idx") is True
+    assert journal.status_counts() == {"uploaded": 2, "embedded": 1}
+    blobs = [_blob("done.md", "aaa"), _blob("half.md", "bbb"), _blob("empty.md", "changed")]
+    assert [b.name for b in skip_done(blobs, journal)] == ["half.md", "empty.md"]
+    assert journal.uploaded_ids() == {"d0", "d1"}
+    journal.finish()
+    journal.close()
+
+    # After a finished build the next run starts from scratch
+    journal = BuildJournal(path)
+    assert journal.begin("full", "idx") is False
+    assert journal.status_counts() == {}
+    journal.close()
+
+
+def test_plan_incremental_detects_changed_new_and_removed_notes():
+    blobs = [_blob("same.md", "aaa"), _blob("edited.md", "new"), _blob("added.md", "ccc")]
+    indexed = {
+        "same.md": {"md5": {"aaa"}, "ids": ["s0"]},
+        "edited.md": {"md5": {"old"}, "ids": ["e0", "e1"]},
+        "gone.md": {"md5": {"ddd"}, "ids": ["g0"]},
+    }
+
+    changed, removed = plan_incremental(blobs, indexed)
+
+    assert [b.name for b in changed] == ["edited.md", "added.md"]
+    assert removed == ["gone.md"]
+
+
+def test_plan_incremental_reindexes_notes_without_hash():
+    changed, removed = plan_incremental([_blob("legacy.md")], {"legacy.md": {"md5": {""}, "ids": ["l0"]}})
+    assert [b.name for b in changed] == ["legacy.md"]
+    assert removed == []
+
+
+def test_upload_vault_sync_skips_unchanged_and_deletes_orphans(tmp_path: Path):
+    (tmp_path / "same.md").write_text("unchanged", encoding="utf-8")
+    (tmp_path / "edited.md").write_text("new text", encoding="utf-8")
+
+    service = MagicMock()
+    container = service.get_container_client.return_value
+    container.list_blobs.return_value = [
+        SimpleNamespace(name="same.md", metadata={"md5": note_hash("unchanged", "same", [])}),
+        SimpleNamespace(name="edited.md", metadata={"md5": note_hash("old text", "edited", [])}),
+        SimpleNamespace(name="gone.md", metadata={"md5": "x"}),
+    ]
+
+    with (
+        patch("src.ingestion.upload_vault.settings") as mock_settings,
+        patch("src.ingestion.upload_vault.create_service_client") as mock_create,
+    ):
+        mock_settings.obsidian_vault_path = str(tmp_path)
+        mock_settings.upload_workers = 4
+        mock_create.return_value = service
+        upload_vault.run(sync=True)
+
+    uploaded = [c.kwargs["blob"] for c in service.get_blob_client.call_args_list]
+    assert uploaded == ["edited.md"]
+    container.delete_blobs.assert_called_once_with("gone.md")
+
+
+def test_get_embeddings_only_requests_cache_misses(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=1_000_000)
+    cache.put_many("text-embedding-3-small:2d", ["cached"], [[0.5, 0.25]])
+    client = _embeddings_client(SimpleNamespace(index=0, embedding=[1.0, 2.0]))
+
+    with (
+        patch("src.ingestion.build_index.get_embedding_cache", return_value=cache),
+        patch.object(settings, "azure_openai_embedding_deployment", "text-embedding-3-small"),
+        patch.object(settings, "embedding_dimensions", 2),
+    ):
+        vectors = get_embeddings(client, ["cached", "fresh"])
+
+    assert vectors == [[0.5, 0.25], [1.0, 2.0]]
+    assert client.embeddings.with_raw_response.create.call_args.kwargs["input"] == ["fresh"]
+    assert client.embeddings.with_raw_response.create.call_args.kwargs["dimensions"] == 2
+    assert cache.get_many("text-embedding-3-small:2d", ["fresh"]) == [[1.0, 2.0]]
+
+
+def test_get_embeddings_omits_dimensions_at_the_default_size():
+    # text-embedding-ada-002 deployments reject the `dimensions` parameter
+    client = _embeddings_client(SimpleNamespace(index=0, embedding=[1.0] * 1536))
+
+    with (
+        patch("src.ingestion.build_index.get_embedding_cache", return_value=None),
+        patch.object(settings, "embedding_dimensions", 1536),
+    ):
+        get_embeddings(client, ["text"])
+
+    assert "dimensions" not in client.embeddings.with_raw_response.create.call_args.kwargs
+
+
+def test_embedding_options_omit_only_the_native_size():
+    with patch.object(settings, "embedding_model_dimensions", 3072):  # text-embedding-3-large
+        assert settings.embedding_options(1536) == {"dimensions": 1536}
+        assert settings.embedding_options(3072) == {}
+    with patch.object(settings, "embedding_model_dimensions", 1536):  # ada-002 rejects the parameter
+        assert settings.embedding_options(1536) == {}
+
+
+def test_get_embeddings_shortens_longer_cached_vectors(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=1_000_000)
+    # Cached before the size was configurable: full-size vector under the bare model name
+    cache.put_many("text-embedding-3-small", ["legacy"], [[3.0, 4.0, 12.0]])
+    client = MagicMock()
+
+    with (
+        patch("src.ingestion.build_index.get_embedding_cache", return_value=cache),
+        patch("src.ingestion.build_index.settings") as mock_settings,
+    ):
+        mock_settings.azure_openai_embedding_deployment = "text-embedding-3-small"
+        mock_settings.embedding_dimensions = 2
+        vectors = get_embeddings(client, ["legacy"])
+
+    assert vectors == [pytest.approx([0.6, 0.8])]
+    client.embeddings.with_raw_response.create.assert_not_called()
+
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", max_bytes=4 * 16)  # Room for four 4-dim vectors
+    with patch("src.ingestion.embedding_cache.time.time", side_effect=range(100)):
+        for text in ["a", "b", "c", "d"]:
+            cache.put_many("m", [text], [[1.0] * 4])
+        cache.get_many("m", ["a"])  # Touch "a" so "b" is now the oldest entry
+        cache.put_many("m", ["e"], [[1.0] * 4])
+        found = cache.get_many("m", ["a", "b", "c", "d", "e"])
+
+    # Eviction shrinks the cache to 90% of max_bytes: the two oldest entries ("b", "c") go
+    assert [vector is not None for vector in found] == [True, False, False, True, True]
+    assert cache.size_bytes <= cache.max_bytes
+
+
+def _word_count(text: str) -> int:
+    return len(text.split())
+
+
+def _word_token_ends(text: str) -> np.ndarray:
+    """Test tokenizer: one token per whitespace-separated word."""
+    return np.array([m.end() for m in re.finditer(r"\S+", text)], dtype=np.int64)
+
+
+def test_chunk_markdown_respects_budget_and_keeps_code_blocks_whole():
+    note = (
+        "# Docker\n\nShort intro.\n\n## Networking\n\n"
+        + " ".join(f"word{i}" for i in range(50))
+        + "\n\n```bash\ndocker network ls\ndocker network inspect bridge\n```\n"
+    )
+
+    chunks = chunk_markdown(note, max_tokens=20, token_ends=_word_token_ends)
+
+    assert all(_word_count(c) <= 20 for c in chunks)
+    assert any("```bash\ndocker network ls\ndocker network inspect bridge\n```" in c for c in chunks)
+    # Every word survives and no word is cut in half
+    words = [w for c in chunks for w in c.split() if w.startswith("word")]
+    assert words == [f"word{i}" for i in range(50)]
+
+
+def test_chunk_markdown_carries_heading_path():
+    note = "# Docker\n\n## Networking\n\n" + "\n\n".join(f"para {i} " + "x " * 8 for i in range(4))
+
+    chunks = chunk_markdown(note, max_tokens=15, token_ends=_word_token_ends)
+
+    assert len(chunks) > 1
+    assert all(c.startswith(("# Docker", "Docker > Networking", "Docker\n\n## Networking")) for c in chunks)
+
+
+def test_chunk_markdown_stream_matches_whole_note_and_keeps_headings():
+    note = "# Docker\n\n## Networking\n\n" + "\n\n".join(f"para{i} " + "x " * 8 for i in range(12))
+    pieces = [note[i:i + 7] for i in range(0, len(note), 7)]
+
+    whole = chunk_markdown(note, max_tokens=15, token_ends=_word_token_ends)
+    single_window = list(chunk_markdown_stream(pieces, 15, _word_token_ends, window=10_000))
+    small_windows = list(chunk_markdown_stream(pieces, 15, _word_token_ends, window=40))
+
+    assert single_window == whole
+    assert len(small_windows) > 1
+    assert all(c.startswith("Docker > Networking") for c in small_windows[1:])
+    paras = [w for c in small_windows for w in c.split() if w.startswith("para")]
+    assert paras == [f"para{i}" for i in range(12)]
+
+
+def test_prune_versions_keeps_recent_and_live_versions():
+    index_client = MagicMock()
+    index_client.list_index_names.return_value = [
+        "notes-v20250101000000",
+        "notes-v20250301000000",
+        "notes-v20250201000000",
+        "notes-v20250401000000",
+        "notes-archive",
+    ]
+    # Rolled back to an older version: it must survive pruning
+    index_client.get_alias.return_value.indexes = ["notes-v20250101000000"]
+
+    deleted = prune_versions(index_client, "notes", keep=2)
+
+    assert deleted == ["notes-v20250201000000"]
+    index_client.delete_index.assert_called_once_with("notes-v20250201000000")
+
+
+def test_swap_alias_replaces_concrete_index_once():
+    index_client = MagicMock()
+    index_client.list_index_names.return_value = ["notes", "notes-v20250101000000"]
+
+    swap_alias(index_client, "notes", "notes-v20250101000000")
+
+    index_client.delete_index.assert_called_once_with("notes")
+    alias = index_client.create_or_update_alias.call_args.args[0]
+    assert (alias.name, alias.indexes) == ("notes", ["notes-v20250101000000"])
+
+
+def test_validate_version_rejects_incomplete_or_shrunken_index():
+    validate_version(count=900, expected=900, live_count=1000, min_ratio=0.5)
+    with pytest.raises(RuntimeError, match="expected"):
+        validate_version(count=850, expected=900, live_count=1000, min_ratio=0.5)
+    with pytest.raises(RuntimeError, match="empty"):
+        validate_version(count=0, expected=0, live_count=None, min_ratio=0.5)
+    with pytest.raises(RuntimeError, match="fewer than"):
+        validate_version(count=100, expected=100, live_count=1000, min_ratio=0.5)
+
+
+class _PagedSearchClient:
+    """Fake search client over sorted ids that honours `id gt` filters, top and skip."""
+
+    def __init__(self, ids: list[str], sortable: bool = True):
+        self.ids = sorted(ids)
+        self.sortable = sortable
+        self.deleted: list[list[dict]] = []
+
+    def search(self, text, select, filter=None, order_by=None, top=50, skip=0):
+        if order_by and not self.sortable:
+            raise HttpResponseError(message="Field 'id' is not sortable")
+        ids = self.ids
+        if filter and (last := re.search(r"id gt '([^']*)'", filter)):
+            ids = [i for i in ids if i > last.group(1)]
+        return [{"id": i} for i in ids[skip:skip + top]]
+
+    def delete_documents(self, batch):
+        self.deleted.append(batch)
+        removed = {doc["id"] for doc in batch}
+        self.ids = [i for i in self.ids if i not in removed]
+
+
+@pytest.mark.parametrize("sortable", [True, False])
+def test_iter_ids_pages_past_the_result_cap(sortable: bool):
+    ids = [f"doc{i:05d}" for i in range(2500)]
+    client = _PagedSearchClient(ids, sortable=sortable)
+
+    assert list(iter_ids(client)) == ids
+
+
+@pytest.mark.parametrize("sortable", [True, False])
+def test_delete_sources_removes_every_chunk_while_paging(sortable: bool):
+    client = _PagedSearchClient([f"gone.md-{i:05d}" for i in range(3000)], sortable=sortable)
+
+    deleted = delete_sources(client, ["gone.md"], batch_size=1000, workers=1)
+
+    assert deleted == 3000
+    assert client.ids == []
+
+
+def test_delete_ids_uses_bounded_batches():
+    client = _PagedSearchClient([])
+
+    deleted = delete_ids(client, (f"doc{i}" for i in range(2500)), batch_size=1000, workers=3)
+
+    assert deleted == 2500
+    assert sorted(len(batch) for batch in client.deleted) == [500, 1000, 1000]
+
+
+def test_batch_by_bytes_bounds_serialized_size():
+    docs = [{"id": str(i), "content_vector": [0.123456] * 100} for i in range(10)]
+    size = serialized_size(docs[0])
+
+    batches = list(batch_by_bytes(docs, max_bytes=3 * size + 10))
+
+    assert [len(b) for b in batches] == [3, 3, 3, 1]
+    assert list(batch_by_bytes(docs, max_bytes=10**9, max_items=4))[0] == docs[:4]
+
+
+def _indexing_result(key: str, status: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        key=key,
+        succeeded=status in (200, 201),
+        status_code=status,
+        error_message=None if status < 300 else "error",
+    )
+
+
+def test_upload_batch_retries_only_failed_keys():
+    client = MagicMock()
+    client.upload_documents.side_effect = [
+        [_indexing_result("a", 201), _indexing_result("b", 503), _indexing_result("c", 200)],
+        [_indexing_result("b", 201)],
+    ]
+    batch = [{"id": key, "source_path": "n.md"} for key in "abc"]
+
+    with patch("src.ingestion.build_index.time.sleep"):
+        uploaded = upload_batch(client, batch)
+
+    assert sorted(uploaded) == ["a", "b", "c"]
+    assert client.upload_documents.call_args_list[1].args[0] == [{"id": "b", "source_path": "n.md"}]
+
+
+def test_upload_batch_fails_on_rejected_documents():
+    client = MagicMock()
+    client.upload_documents.return_value = [_indexing_result("a", 201), _indexing_result("b", 400)]
+
+    with pytest.raises(RuntimeError, match="rejected"):
+        upload_batch(client, [{"id": "a"}, {"id": "b"}])
+
+
+def test_ensure_index_configures_int8_compression_with_rescoring():
+    index_client = MagicMock()
+    index_client.list_indexes.return_value = []
+    with patch.object(settings, "vector_quantization", "int8"):
+        ensure_index(index_client, "notes")
+
+    vector_search = index_client.create_index.call_args.args[0].vector_search
+    (compression,) = vector_search.compressions
+    assert compression.rerank_with_original_vectors
+    assert compression.default_oversampling == settings.vector_oversampling
+    assert vector_search.profiles[0].compression_configuration_name == compression.name
+
+    with patch.object(settings, "vector_quantization", "binary"), pytest.raises(ValueError):
+        ensure_index(index_client, "notes")
+
+
+def test_ensure_index_refuses_a_different_vector_size():
+    existing = SimpleNamespace(
+        name="notes",
+        fields=[SimpleNamespace(name="content_vector", vector_search_dimensions=1536)],
+        vector_search=None,
+    )
+    index_client = MagicMock()
+    index_client.list_indexes.return_value = [existing]
+
+    with patch.object(settings, "embedding_dimensions", 512), pytest.raises(ValueError, match="blue-green"):
+        ensure_index(index_client, "notes")
+    index_client.create_or_update_index.assert_not_called()
+
+
+# ── Index builds against in-memory fakes ────────────────────────────────────
+class _FakeSearchIndex:
+    """In-memory search index: keyset/skip paging, source_path filters, uploads and deletes."""
+
+    def __init__(self, docs: list[dict] = (), fail_uploads_after: int | None = None):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.fail_uploads_after = fail_uploads_after
+        self.log: list[tuple[str, str]] = []   # ("upload" | "delete", document id)
+
+    def search(self, text, select, filter=None, order_by=None, top=50, skip=0):
+        docs = sorted(self.docs.values(), key=lambda doc: doc["id"])
+        if filter and (paths := re.search(r"search\.in\(source_path, '([^']*)', '\|'\)", filter)):
+            docs = [doc for doc in docs if doc["source_path"] in paths.group(1).split("|")]
+        if filter and (last := re.search(r"id gt '([^']*)'", filter)):
+            docs = [doc for doc in docs if doc["id"] > last.group(1)]
+        return [{field: doc.get(field) for field in select} for doc in docs[skip:skip + top]]
+
+    def upload_documents(self, docs):
+        uploads = sum(1 for action, _ in self.log if action == "upload")
+        if self.fail_uploads_after is not None and uploads >= self.fail_uploads_after:
+            raise ConnectionError("Connection reset by peer")
+        for doc in docs:
+            self.docs[doc["id"]] = doc
+            self.log.append(("upload", doc["id"]))
+        return [_indexing_result(doc["id"], 201) for doc in docs]
+
+    def delete_documents(self, batch):
+        for doc in batch:
+            self.docs.pop(doc["id"], None)
+            self.log.append(("delete", doc["id"]))
+
+    def get_document_count(self) -> int:
+        return len(self.docs)
+
+    def notes(self) -> dict[str, list[str]]:
+        """{source_path: chunk contents in order}."""
+        notes: dict[str, list] = {}
+        for doc in sorted(self.docs.values(), key=lambda doc: doc["chunk_index"]):
+            notes.setdefault(doc["source_path"], []).append(doc["content"])
+        return notes
+
+
+class _FakeContainer:
+    """Blob container of Markdown notes; a note's md5 metadata follows its text."""
+
+    def __init__(self, notes: dict[str, str]):
+        self.notes = dict(notes)
+
+    def list_blobs(self, include=None):
+        return [
+            _blob(name, hashlib.md5(text.encode()).hexdigest()) for name, text in sorted(self.notes.items())
+        ]
+
+    def get_blob_client(self, name: str):
+        data = self.notes[name].encode()
+        return SimpleNamespace(download_blob=lambda: SimpleNamespace(chunks=lambda: [data]))
+
+
+def _fake_openai() -> MagicMock:
+    """Embeddings client returning one 2-dimensional vector per input, recording the inputs."""
+    def create(**kwargs):
+        parsed = SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[1.0, float(len(text))]) for i, text in enumerate(kwargs["input"])
+        ])
+        return SimpleNamespace(headers={}, parse=lambda: parsed)
+
+    client = MagicMock()
+    client.embeddings.with_raw_response.create.side_effect = create
+    return client
+
+
+def _embedded_texts(client: MagicMock) -> list[str]:
+    return [text for call in client.embeddings.with_raw_response.create.call_args_list for text in call.kwargs["input"]]
+
+
+def _offline_indexing() -> ExitStack:
+    """Chunks notes by paragraph (no tokenizer download) and disables the embedding cache."""
+    stack = ExitStack()
+    stack.enter_context(patch(
+        "src.ingestion.build_index.chunk_text_stream", side_effect=lambda pieces: "".join(pieces).split("\n\n")
+    ))
+    stack.enter_context(patch("src.ingestion.build_index.get_embedding_cache", return_value=None))
+    return stack
+
+
+def test_index_incremental_reindexes_changed_notes_and_drops_stale_chunks():
+    container = _FakeContainer({
+        "keep.md": "k1\n\nk2",
+        "shrink.md": "s1\n\ns2\n\ns3",
+        "gone.md": "g1",
+    })
+    search_index = _FakeSearchIndex()
+    with _offline_indexing():
+        index_incremental(container, search_index, _fake_openai(), index_serial, None)
+        assert search_index.notes() == {"keep.md": ["k1", "k2"], "shrink.md": ["s1", "s2", "s3"], "gone.md": ["g1"]}
+
+        container.notes["shrink.md"] = "s1 edited"
+        del container.notes["gone.md"]
+        container.notes["new.md"] = "n1"
+        openai_client = _fake_openai()
+        index_incremental(container, search_index, openai_client, index_serial, None)
+
+    # Trailing chunks of the shortened note and every chunk of the removed one are gone
+    assert search_index.notes() == {"keep.md": ["k1", "k2"], "shrink.md": ["s1 edited"], "new.md": ["n1"]}
+    assert sorted(_embedded_texts(openai_client)) == ["n1", "s1 edited"]  # Unchanged notes are not re-embedded
+
+
+def test_index_local_rebuilds_and_updates_incrementally(tmp_path: Path):
+    container = _FakeContainer({"keep.md": "k1\n\nk2", "shrink.md": "s1\n\ns2", "gone.md": "g1"})
+    path = tmp_path / "local-index"
+
+    def notes() -> dict[str, list[str]]:
+        index = LocalVectorIndex.load(path)
+        result: dict[str, list] = {}
+        for doc in sorted(index.documents, key=lambda doc: doc["chunk_index"]):
+            result.setdefault(doc["source_path"], []).append(doc["content"])
+        return result
+
+    with (
+        _offline_indexing(),
+        patch.object(settings, "local_index_path", str(path)),
+        patch.object(settings, "local_index_hnsw", False),
+        patch.object(settings, "vector_quantization", "none"),
+        patch.object(settings, "embedding_dimensions", 2),
+    ):
+        index_local(container, _fake_openai(), incremental=False)
+        assert notes() == {"keep.md": ["k1", "k2"], "shrink.md": ["s1", "s2"], "gone.md": ["g1"]}
+
+        container.notes["shrink.md"] = "s1"
+        del container.notes["gone.md"]
+        openai_client = _fake_openai()
+        index_local(container, openai_client, incremental=True)
+
+    assert notes() == {"keep.md": ["k1", "k2"], "shrink.md": ["s1"]}
+    assert _embedded_texts(openai_client) == ["s1"]
+
+
+def _indexed_doc(source_path: str, chunk_index: int, content: str) -> dict:
+    return {"id": f"{source_path}-{chunk_index}", "source_path": source_path, "chunk_index": chunk_index, "content": content}
+
+
+def test_index_full_overwrites_in_place_and_prunes_at_the_end():
+    container = _FakeContainer({"a.md": "a1", "b.md": "b1\n\nb2"})
+    # Left over from an earlier build: a removed note, whose chunks must go only after the upload
+    search_index = _FakeSearchIndex([_indexed_doc("old.md", 0, "o1"), _indexed_doc("old.md", 1, "o2")])
+
+    with _offline_indexing():
+        count = index_full(container, search_index, _fake_openai(), index_serial, None)
+
+    assert count == 3
+    assert search_index.notes() == {"a.md": ["a1"], "b.md": ["b1", "b2"]}
+    actions = [action for action, _ in search_index.log]
+    assert actions == ["upload"] * 3 + ["delete"] * 2  # Searchable throughout the rebuild
+
+
+def test_index_full_resumes_after_an_interrupted_upload(tmp_path: Path):
+    container = _FakeContainer({"a.md": "a1", "b.md": "b1\n\nb2", "c.md": "c1"})
+    search_index = _FakeSearchIndex([_indexed_doc("old.md", 0, "o1")], fail_uploads_after=1)
+
+    with (
+        _offline_indexing(),
+        patch.object(settings, "upload_batch_max_bytes", 1),  # One document per upload request
+        patch.object(settings, "index_upload_workers", 1),
+    ):
+        journal = BuildJournal(tmp_path / "checkpoint.sqlite")
+        journal.begin("full", "notes")
+        with pytest.raises(ConnectionError):
+            index_full(container, search_index, _fake_openai(), index_serial, journal)
+        journal.close()  # The build dies after uploading a.md
+        assert "old.md" in search_index.notes()  # Nothing was pruned
+
+        search_index.fail_uploads_after = None
+        journal = BuildJournal(tmp_path / "checkpoint.sqlite")
+        assert journal.begin("full", "notes") is True
+        openai_client = _fake_openai()
+        count = index_full(container, search_index, openai_client, index_serial, journal)
+        journal.close()
+
+    assert count == 4  # a.md counts although it was skipped
+    assert search_index.notes() == {"a.md": ["a1"], "b.md": ["b1", "b2"], "c.md": ["c1"]}
+    assert sorted(_embedded_texts(openai_client)) == ["b1", "b2", "c1"]
+
+
+def _versioned_index_client(alias: str, versions: list[str], live_count: int) -> MagicMock:
+    """Index client with `versions` behind `alias` (the last one live); tracks created indexes."""
+    names = list(versions)
+    index_client = MagicMock()
+    index_client.list_index_names.side_effect = lambda: list(names)
+    index_client.list_indexes.side_effect = lambda: [SimpleNamespace(name=name) for name in names]
+    index_client.create_index.side_effect = lambda index: names.append(index.name)
+    index_client.delete_index.side_effect = names.remove
+    index_client.get_alias.return_value.indexes = [versions[-1]]
+    index_client.get_search_client.return_value.get_document_count.return_value = live_count
+    return index_client
+
+
+def test_publish_version_refuses_to_swap_to_an_incomplete_version():
+    index_client = _versioned_index_client("notes", ["notes-v20250101000000", "notes-v20250201000000"], live_count=3)
+    new_version = _FakeSearchIndex([_indexed_doc("a.md", 0, "a1")])
+
+    with patch.object(settings, "index_swap_count_timeout_seconds", 0), pytest.raises(RuntimeError, match="expected"):
+        publish_version(index_client, new_version, "notes", "notes-v20250201000000", "notes-v20250301000000", 3)
+
+    index_client.create_or_update_alias.assert_not_called()
+    index_client.delete_index.assert_not_called()
+
+
+def test_run_blue_green_builds_a_new_version_and_swaps_the_alias(tmp_path: Path):
+    old, live = "notes-v20250101000000", "notes-v20250201000000"
+    index_client = _versioned_index_client("notes", [old, live], live_count=2)
+    container = _FakeContainer({"a.md": "a1", "b.md": "b1\n\nb2"})
+    indexes: dict[str, _FakeSearchIndex] = {}
+
+    with (
+        _offline_indexing(),
+        patch("src.ingestion.build_index.BlobServiceClient") as blob_service,
+        patch("src.ingestion.build_index.AzureOpenAI", return_value=_fake_openai()),
+        patch("src.ingestion.build_index.SearchIndexClient", return_value=index_client),
+        patch(
+            "src.ingestion.build_index.SearchClient",
+            side_effect=lambda endpoint, name, credential: indexes.setdefault(name, _FakeSearchIndex()),
+        ),
+        patch.object(settings, "azure_search_index_name", "notes"),
+        patch.object(settings, "index_checkpoint_path", str(tmp_path / "checkpoint.sqlite")),
+        patch.object(settings, "index_keep_versions", 2),
+    ):
+        blob_service.from_connection_string.return_value.get_container_client.return_value = container
+        run(blue_green=True)
+
+    [target] = indexes
+    assert target not in (old, live)
+    assert indexes[target].notes() == {"a.md": ["a1"], "b.md": ["b1", "b2"]}
+    alias = index_client.create_or_update_alias.call_args.args[0]
+    assert (alias.name, alias.indexes) == ("notes", [target])
+    # The previous version stays for rollback, older ones are pruned
+    index_client.delete_index.assert_called_once_with(old)
+
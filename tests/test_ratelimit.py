@@ -0,0 +1,74 @@
+"""Tests for the client-side rate limiter."""
+
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+from src.ratelimit import RateLimiter, retry_after_seconds
+
+
+def _rate_limit_error(headers: dict) -> RateLimitError:
+    request = httpx.Request("POST", "https://example.openai.azure.com/embeddings")
+    response = httpx.Response(429, headers=headers, request=request)
+    return RateLimitError("Too Many Requests", response=response, body=None)
+
+
+def test_retry_after_seconds_prefers_milliseconds_header():
+    assert retry_after_seconds(httpx.Headers({"retry-after-ms": "1500", "retry-after": "2"})) == 1.5
+    assert retry_after_seconds(httpx.Headers({"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(httpx.Headers({})) is None
+
+
+def test_call_retries_throttled_requests_and_halves_concurrency():
+    clock = [0.0]
+    sleeps: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    func = MagicMock(side_effect=[_rate_limit_error({"retry-after": "2"}), "ok"])
+    with (
+        patch("src.ratelimit.time.monotonic", side_effect=lambda: clock[0]),
+        patch("src.ratelimit.time.sleep", side_effect=sleep),
+    ):
+        limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=8, max_retries=3)
+        assert limiter.call(func, input="x", tokens=10) == "ok"
+
+    assert func.call_count == 2
+    assert limiter.throttled == 1
+    assert 4 <= limiter.concurrency < 5  # Halved, then one additive step
+    assert sleeps == [2.0]
+
+
+def test_call_gives_up_after_max_retries():
+    limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=2, max_retries=1)
+    func = MagicMock(side_effect=_rate_limit_error({"retry-after-ms": "1"}))
+
+    with pytest.raises(RateLimitError):
+        limiter.call(func)
+    assert func.call_count == 2
+
+
+def test_token_bucket_delays_requests_beyond_the_quota():
+    with patch("src.ratelimit.time.monotonic", return_value=0.0):
+        limiter = RateLimiter(rpm=0, tpm=6_000, max_concurrency=4)  # 100 tokens/s, burst 1000
+        assert limiter._try_acquire(1000) == 0
+        limiter.release()
+        assert limiter._try_acquire(500) == pytest.approx(5.0)
+    with patch("src.ratelimit.time.monotonic", return_value=5.0):
+        assert limiter._try_acquire(500) == 0
+
+
+def test_call_raw_reads_rate_limit_headers_of_successful_responses():
+    parsed = object()
+    raw = MagicMock(headers=httpx.Headers({"x-ratelimit-remaining-tokens": "100"}))
+    raw.parse.return_value = parsed
+
+    with patch("src.ratelimit.time.monotonic", return_value=0.0):
+        limiter = RateLimiter(rpm=0, tpm=6_000, max_concurrency=4)  # 100 tokens/s, burst 1000
+        assert limiter.call_raw(MagicMock(return_value=raw), tokens=10) is parsed
+        # Other clients used most of the quota: 500 tokens now take 4 s instead of none
+        assert limiter._try_acquire(500) == pytest.approx(4.0)
@@ -0,0 +1,480 @@
+"""Tests for the retrieval module."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import numpy as np
+import pytest
+from azure.core.exceptions import HttpResponseError
+from openai import AzureOpenAI
+
+from src.ratelimit import RateLimiter
+from src.retrieval import rag
+from src.retrieval.cache import SemanticCache, TTLCache, normalize_query
+from src.retrieval.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from src.retrieval.keyword_index import KeywordIndex
+from src.retrieval.local_index import LocalIndexWriter, LocalVectorIndex
+from src.retrieval.retrievers import SEARCH_FIELDS, AzureSearchRetriever, LocalRetriever, to_context_doc
+
+
+def _embedding_response(vector: list[float]) -> SimpleNamespace:
+    """Raw response as returned by `embeddings.with_raw_response.create`."""
+    parsed = SimpleNamespace(data=[SimpleNamespace(index=0, embedding=vector)])
+    return SimpleNamespace(headers={}, parse=lambda: parsed)
+
+
+def _openai_mock() -> MagicMock:
+    client = MagicMock()
+    client.with_options.return_value = client  # Per-call options such as max_retries
+    return client
+
+
+def _index_definition(*fields: str, dimensions: int | None = None) -> SimpleNamespace:
+    """What `rag._live_index` returns: the definition of the live search index."""
+    definition = SimpleNamespace(fields=[SimpleNamespace(name=name) for name in fields])
+    if dimensions:
+        definition.fields.append(SimpleNamespace(name="content_vector", vector_search_dimensions=dimensions))
+    return definition
+
+
+def _chunk(source_path: str, chunk_index: int, vector: list[float], content: str | None = None) -> dict:
+    return {
+        "id": f"{source_path}-{chunk_index}",
+        "title": source_path,
+        "content": content or f"chunk {chunk_index} of {source_path}",
+        "tags": "",
+        "source_path": source_path,
+        "chunk_index": chunk_index,
+        "content_md5": "v1",
+        "content_vector": vector,
+    }
+
+
+def test_normalize_query():
+    assert normalize_query("  What are my  Docker\tnotes? ") == "what are my docker notes?"
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(max_entries=2, ttl=10)
+    with patch("src.retrieval.cache.time.monotonic", return_value=0):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")      # "b" becomes least recently used
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+    with patch("src.retrieval.cache.time.monotonic", return_value=11):
+        assert cache.get("a") is None
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 2}
+
+
+def test_embed_query_caches_normalized_queries():
+    client = _openai_mock()
+    client.embeddings.with_raw_response.create.return_value = _embedding_response([0.1, 0.2])
+    with (
+        patch.object(rag, "_openai_client", client),
+        patch.object(rag, "_retriever", SimpleNamespace(dimensions=None)),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+    ):
+        assert rag.embed_query("What is Docker?") == [0.1, 0.2]
+        assert rag.embed_query("what is   docker?") == [0.1, 0.2]
+        assert rag.cache_stats()["query_embeddings"]["hits"] == 1
+
+    client.embeddings.with_raw_response.create.assert_called_once()
+
+
+def test_embed_query_leaves_429s_to_the_shared_rate_limiter():
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) <= 2:
+            return httpx.Response(429, headers={"retry-after-ms": "1"}, json={"error": {"message": "busy"}})
+        return httpx.Response(200, json={
+            "object": "list", "model": "text-embedding-3-small",
+            "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2]}],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        })
+
+    client = AzureOpenAI(
+        azure_endpoint="https://example.openai.azure.com",
+        api_key="key",
+        api_version="2024-02-01",
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    limiter = RateLimiter(rpm=0, tpm=0, max_concurrency=8)
+
+    with (
+        patch.object(rag, "_openai_client", client),
+        patch.object(rag, "_retriever", SimpleNamespace(dimensions=None)),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+        patch.object(rag, "embedding_limiter", return_value=limiter),
+    ):
+        assert rag.embed_query("What is Docker?") == [0.1, 0.2]
+
+    assert len(attempts) == 3     # No hidden SDK retries on top of the limiter's
+    assert limiter.throttled == 2
+    assert limiter.concurrency < 8
+
+
+def test_semantic_cache_matches_similar_vectors_and_invalidates_on_new_source_version():
+    cache = SemanticCache(max_entries=10, ttl=60, threshold=0.9)
+    result = {"answer": "cached", "sources": []}
+    cache.store([1.0, 0.0], top_k=5, result=result, sources={"docker.md": "v1"})
+
+    assert cache.lookup([0.99, 0.05], top_k=5) == result
+    assert cache.lookup([0.99, 0.05], top_k=3) is None   # Different top_k
+    assert cache.lookup([0.0, 1.0], top_k=5) is None     # Not similar enough
+
+    cache.observe({"docker.md": "v1", "other.md": "x"})
+    assert cache.lookup([1.0, 0.0], top_k=5) == result
+    cache.observe({"docker.md": "v2"})
+    assert cache.lookup([1.0, 0.0], top_k=5) is None
+
+
+def test_semantic_cache_drops_entries_of_another_vector_size():
+    cache = SemanticCache(max_entries=10, ttl=60, threshold=0.9)
+    cache.store([1.0, 0.0], top_k=5, result={"answer": "old"}, sources={})
+
+    assert cache.lookup([1.0, 0.0, 0.0], top_k=5) is None
+    cache.store([1.0, 0.0, 0.0], top_k=5, result={"answer": "new"}, sources={})
+    assert cache.lookup([1.0, 0.0, 0.0], top_k=5) == {"answer": "new"}
+    assert cache.stats()["entries"] == 1
+
+
+def test_retrieve_context_follows_the_vector_size_of_a_swapped_index():
+    # The alias was repointed at a version rebuilt at 512 dimensions after the API started
+    openai_client = _openai_mock()
+    openai_client.embeddings.with_raw_response.create.return_value = _embedding_response([1.0, 0.0])
+    search_client = MagicMock()
+    search_client.search.side_effect = [
+        HttpResponseError("The vector field 'content_vector' expects 512 dimensions"),
+        [{"id": "a-0", "title": "A", "content": "...", "source_path": "a.md", "@search.score": 1.0}],
+    ]
+    settings = rag.get_settings()
+
+    with (
+        patch.object(rag, "_openai_client", openai_client),
+        patch.object(rag, "_search_client", search_client),
+        patch.object(rag, "_retriever", AzureSearchRetriever(rag.search_client, MagicMock(), dimensions=1536)),
+        patch.object(rag, "_live_index", return_value=_index_definition(*SEARCH_FIELDS, dimensions=512)),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+        patch.object(settings, "retrieval_keyword_weight", 0),
+        patch.object(settings, "embedding_model_dimensions", 1536),
+    ):
+        docs = rag.retrieve_context("containers", top_k=1)
+        assert rag.query_dimensions() == 512
+
+    assert [doc["source_path"] for doc in docs] == ["a.md"]
+    requests = openai_client.embeddings.with_raw_response.create.call_args_list
+    assert ["dimensions" in call.kwargs for call in requests] == [False, True]
+    assert requests[1].kwargs["dimensions"] == 512
+
+
+def test_ask_reuses_answer_for_similar_question():
+    openai_client = _openai_mock()
+    openai_client.embeddings.with_raw_response.create.return_value = _embedding_response([1.0, 0.0])
+    openai_client.chat.completions.create.return_value = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Docker notes"))]
+    )
+    search_client = MagicMock()
+    search_client.search.return_value = [{
+        "id": "docker-0", "title": "Docker", "content": "...", "tags": "",
+        "source_path": "docker.md", "content_md5": "v1", "@search.score": 1.0,
+    }]
+
+    with (
+        patch.object(rag, "_openai_client", openai_client),
+        patch.object(rag, "_search_client", search_client),
+        patch.object(rag, "_retriever", None),
+        patch.object(rag, "_live_index", return_value=_index_definition(*SEARCH_FIELDS)),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+        patch.object(rag, "_answer_cache", SemanticCache(max_entries=10, ttl=60, threshold=0.9)),
+    ):
+        first = rag.ask("What are my Docker notes?")
+        second = rag.ask("What notes do I have on docker?")
+
+    assert first == second
+    assert first["answer"] == "Docker notes"
+    assert search_client.search.call_count == 2  # Keyword and vector query, once
+    openai_client.chat.completions.create.assert_called_once()
+
+
+def test_aask_uses_async_clients():
+    class _AsyncResults:
+        def __init__(self, items):
+            self._items = iter(items)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self._items)
+            except StopIteration:
+                raise StopAsyncIteration from None
+
+    openai_client = _openai_mock()
+    openai_client.embeddings.with_raw_response.create = AsyncMock(return_value=_embedding_response([1.0, 0.0]))
+    openai_client.chat.completions.create = AsyncMock(
+        return_value=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Hi"))])
+    )
+    search_client = MagicMock()
+    search_client.search = AsyncMock(side_effect=lambda **kwargs: _AsyncResults([{
+        "id": "docker-0", "title": "Docker", "content": "...",
+        "source_path": "docker.md", "content_md5": "v1", "@search.score": 1.0,
+    }]))
+
+    with (
+        patch.object(rag, "_async_openai_client", openai_client),
+        patch.object(rag, "_async_search_client", search_client),
+        patch.object(rag, "_retriever", None),
+        patch.object(rag, "_live_index", return_value=_index_definition(*SEARCH_FIELDS)),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+        patch.object(rag, "_answer_cache", SemanticCache(max_entries=0, ttl=60, threshold=0.9)),
+    ):
+        result = asyncio.run(rag.aask("What are my Docker notes?"))
+
+    assert result == {"answer": "Hi", "sources": [{"title": "Docker", "path": "docker.md"}]}
+    assert search_client.search.await_count == 2
+
+
+def test_azure_retriever_selects_only_fields_the_live_index_has():
+    # Indexes built before `content_md5` existed reject a $select of it
+    search_client = MagicMock()
+    search_client.search.return_value = [{
+        "id": "docker-0", "title": "Docker", "content": "...", "tags": "",
+        "source_path": "docker.md", "@search.score": 1.0,
+    }]
+    old_fields = [name for name in SEARCH_FIELDS if name != "content_md5"]
+
+    with (
+        patch.object(rag, "_search_client", search_client),
+        patch.object(rag, "_retriever", None),
+        patch.object(rag, "_live_index", return_value=_index_definition(*old_fields, "content_vector")),
+    ):
+        hits = rag.retriever().keyword_search("docker", 5)
+
+    assert search_client.search.call_args.kwargs["select"] == old_fields
+    assert [to_context_doc(doc)["content_md5"] for doc, _ in hits] == [""]
+
+
+def test_awarm_up_touches_both_services_and_swallows_errors():
+    search_client = MagicMock()
+    search_client.get_document_count = AsyncMock(return_value=42)
+    openai_client = MagicMock()
+    openai_client.with_options.return_value.models.list = AsyncMock(side_effect=Exception("404"))
+
+    with (
+        patch.object(rag, "_async_search_client", search_client),
+        patch.object(rag, "_async_openai_client", openai_client),
+        patch.object(rag, "_retriever", None),
+        patch.object(rag, "_live_index", side_effect=Exception("timeout")),
+    ):
+        timings = asyncio.run(rag.awarm_up(timeout=1))
+
+    assert set(timings) == {"clients", "search", "openai", "retriever"}
+    search_client.get_document_count.assert_awaited_once()
+    openai_client.with_options.return_value.models.list.assert_awaited_once()
+
+
+def test_awarm_up_survives_a_missing_local_index(tmp_path):
+    openai_client = MagicMock()
+    openai_client.with_options.return_value.models.list = AsyncMock(return_value=[])
+    settings = rag.get_settings()
+
+    with (
+        patch.object(rag, "_async_openai_client", openai_client),
+        patch.object(rag, "_retriever", None),
+        patch.object(settings, "retrieval_backend", "local"),
+        patch.object(settings, "local_index_path", str(tmp_path / "missing")),
+    ):
+        timings = asyncio.run(rag.awarm_up(timeout=1))
+        assert rag._retriever is None  # Retried, and reported, on the first question
+
+    assert set(timings) == {"clients", "openai", "retriever"}
+
+
+def test_local_index_ranks_by_cosine_similarity_and_roundtrips(tmp_path):
+    index = LocalVectorIndex.from_documents([
+        _chunk("a.md", 0, [1.0, 0.0]),
+        _chunk("b.md", 0, [0.0, 2.0]),
+        _chunk("c.md", 0, [1.0, 1.0]),
+    ])
+    index.save(tmp_path / "index")
+    loaded = LocalVectorIndex.load(tmp_path / "index")
+
+    for idx in (index, loaded):
+        results = idx.search([0.0, 1.0], top_k=2)
+        assert [doc["source_path"] for doc, _ in results] == ["b.md", "c.md"]
+        assert results[0][1] == pytest.approx(1.0)
+    assert [len(r) for r in loaded.search_many([[1.0, 0.0], [0.0, 1.0]], top_k=5)] == [3, 3]
+
+
+def test_local_index_writer_replaces_chunks_per_note():
+    writer = LocalIndexWriter(LocalVectorIndex.from_documents([
+        _chunk("a.md", 0, [1.0, 0.0]),
+        _chunk("a.md", 1, [1.0, 0.1]),
+        _chunk("b.md", 0, [0.0, 1.0]),
+    ]))
+    assert writer.notes()["a.md"]["ids"] == ["a.md-0", "a.md-1"]
+
+    assert writer.delete_sources(["a.md"]) == 2
+    writer.add([_chunk("a.md", 0, [0.5, 0.5], content="kubernetes pods")])
+    index = writer.build()
+
+    assert [doc["id"] for doc in index.documents] == ["b.md-0", "a.md-0"]
+    assert [doc["id"] for doc, _ in index.keyword_search("kubernetes", 5)] == ["a.md-0"]
+    assert index.keyword_search("chunk", 5)[0][0]["id"] == "b.md-0"
+
+
+def test_local_index_hnsw_matches_exact_search(tmp_path):
+    pytest.importorskip("hnswlib")
+    docs = [_chunk(f"{i}.md", 0, [float(i), 1.0, float(i % 3)]) for i in range(50)]
+    LocalVectorIndex.from_documents(docs).save(tmp_path / "index", hnsw=True)
+
+    exact = LocalVectorIndex.load(tmp_path / "index")
+    approximate = LocalVectorIndex.load(tmp_path / "index", hnsw=True)
+    query = [3.0, 1.0, 0.0]
+    assert [d["id"] for d, _ in approximate.search(query, 5)] == [d["id"] for d, _ in exact.search(query, 5)]
+
+
+def test_local_retriever_searches_off_the_event_loop():
+    local = LocalRetriever(LocalVectorIndex.from_documents([_chunk("a.md", 0, [1.0, 0.0])]))
+    threads = []
+    search = local.index.search
+    local.index.search = lambda vector, k: threads.append(threading.current_thread()) or search(vector, k)
+
+    async def query():
+        hits = await local.avector_search([1.0, 0.0], 1)
+        return hits, threading.current_thread()
+
+    hits, loop_thread = asyncio.run(query())
+
+    assert [doc["id"] for doc, _ in hits] == ["a.md-0"]
+    assert threads and threads[0] is not loop_thread
+
+
+def test_local_index_rejects_queries_of_another_size():
+    index = LocalVectorIndex.from_documents([_chunk("a.md", 0, [1.0, 0.0, 0.0])])
+    with pytest.raises(ValueError, match="EMBEDDING_DIMENSIONS"):
+        index.search([1.0, 0.0], 1)
+
+
+def test_retrieve_context_with_local_backend():
+    client = _openai_mock()
+    client.embeddings.with_raw_response.create.return_value = _embedding_response([0.0, 1.0])
+    local = LocalRetriever(LocalVectorIndex.from_documents([
+        _chunk("a.md", 0, [1.0, 0.0]),
+        _chunk("b.md", 0, [0.0, 1.0]),
+    ]))
+
+    with (
+        patch.object(rag, "_openai_client", client),
+        patch.object(rag, "_retriever", local),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+        patch.object(rag.get_settings(), "retrieval_keyword_weight", 0),
+    ):
+        docs = rag.retrieve_context("containers", top_k=1)
+
+    assert docs == [{
+        "title": "b.md", "content": "chunk 0 of b.md", "tags": "", "source_path": "b.md", "content_md5": "v1",
+    }]
+
+
+def test_keyword_index_bm25_ranking_and_incremental_updates():
+    texts = [
+        "docker compose networking",
+        "docker docker docker volumes",
+        "kubernetes ingress networking and services for a long note about clusters",
+    ]
+    index = KeywordIndex.from_texts(texts)
+
+    assert [row for row, _ in index.search("docker", 5)] == [1, 0]
+    assert [row for row, _ in index.search("networking", 5)] == [0, 2]  # Shorter note first
+    assert index.search("terraform", 5) == []
+
+    updated = index.select([0, 2]).extend(["terraform modules"])
+    rebuilt = KeywordIndex.from_texts([texts[0], texts[2], "terraform modules"])
+    assert updated.terms == rebuilt.terms
+    for query in ("docker", "networking", "terraform modules"):
+        assert updated.search(query, 5) == rebuilt.search(query, 5)
+
+
+def test_reciprocal_rank_fusion_rewards_documents_on_both_lists():
+    a, b, c = {"id": "a"}, {"id": "b"}, {"id": "c"}
+    fused = reciprocal_rank_fusion([[(a, 9.0), (b, 8.0)], [(c, 0.9), (b, 0.8)]])
+    assert [doc["id"] for doc, _ in fused] == ["b", "a", "c"]
+
+    keyword_only = reciprocal_rank_fusion([[(a, 9.0), (b, 8.0)], [(c, 0.9), (b, 0.8)]], weights=[1, 0])
+    assert [doc["id"] for doc, score in keyword_only if score] == ["a", "b"]
+
+
+def test_weighted_score_fusion_normalizes_each_side():
+    a, b, c = {"id": "a"}, {"id": "b"}, {"id": "c"}
+    # BM25 and cosine scores live on different scales; a clear keyword winner dominates
+    fused = weighted_score_fusion([[(a, 30.0), (b, 2.0), (c, 1.0)], [(c, 0.82), (b, 0.81), (a, 0.80)]])
+    assert [doc["id"] for doc, _ in fused] == ["a", "c", "b"]
+
+
+def test_hybrid_retrieval_fetches_candidate_pools_and_fuses_them():
+    client = _openai_mock()
+    client.embeddings.with_raw_response.create.return_value = _embedding_response([0.0, 1.0])
+    local = LocalRetriever(LocalVectorIndex.from_documents([
+        _chunk("a.md", 0, [1.0, 0.0], content="notes on error code ERR_4711"),
+        _chunk("b.md", 0, [0.0, 1.0], content="general troubleshooting"),
+        _chunk("c.md", 0, [0.1, 1.0], content="more troubleshooting"),
+    ]))
+    local.vector_search = MagicMock(wraps=local.vector_search)
+    settings = rag.get_settings()
+    timings: dict = {}
+
+    with (
+        patch.object(rag, "_openai_client", client),
+        patch.object(rag, "_retriever", local),
+        patch.object(rag, "_query_vector_cache", TTLCache(max_entries=10, ttl=60)),
+        patch.object(settings, "retrieval_candidates", 10),
+    ):
+        docs = rag.retrieve_context("ERR_4711", top_k=2, timings=timings)
+        with patch.object(settings, "retrieval_fusion", "weighted"):
+            weighted = asyncio.run(rag.aretrieve_context("ERR_4711", top_k=2))
+
+    # a.md is only found by keyword, b.md ranks first by vector
+    assert {d["source_path"] for d in docs} == {"a.md", "b.md"}
+    assert {d["source_path"] for d in weighted} == {"a.md", "b.md"}
+    local.vector_search.assert_called_with([0.0, 1.0], 10)
+    assert set(timings) == {"embed", "keyword", "vector", "fusion", "total"}
+    assert rag.retrieval_stats()["total"]["count"] >= 2
+
+
+@pytest.mark.parametrize("kind", ["int8", "binary"])
+def test_quantized_local_search_rescores_candidates_in_full_precision(tmp_path, kind):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 64))
+    vectors = centers[rng.integers(0, 20, 400)] + 0.3 * rng.normal(size=(400, 64))
+    docs = [_chunk(f"{i}.md", 0, list(v)) for i, v in enumerate(vectors)]
+    LocalVectorIndex.from_documents(docs).save(tmp_path / "index", quantization_kind=kind)
+
+    exact = LocalVectorIndex.load(tmp_path / "index")
+    quantized = LocalVectorIndex.load(tmp_path / "index", quantization_kind=kind, oversampling=10)
+    assert quantized.codes.kind == kind
+    assert quantized.codes.nbytes < np.asarray(exact.vectors).nbytes / 3
+
+    queries = vectors[:10] + 0.1 * rng.normal(size=(10, 64))
+    for query, want, got in zip(queries, exact.search_many(queries, 5), quantized.search_many(queries, 5)):
+        assert [d["id"] for d, _ in got] == [d["id"] for d, _ in want]
+        assert got[0][1] == pytest.approx(want[0][1], rel=1e-5)  # Scores are exact after rescoring
+
+
+def test_azure_vector_queries_leave_oversampling_to_the_index():
+    client = MagicMock()
+    client.search.return_value = []
+    with patch.object(rag.get_settings(), "vector_quantization", "int8"):
+        AzureSearchRetriever(lambda: client, MagicMock()).vector_search([1.0, 0.0], 5)
+
+    (query,) = client.search.call_args.kwargs["vector_queries"]
+    assert query.oversampling is None
+    assert query.k_nearest_neighbors == 5